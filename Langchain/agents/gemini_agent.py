@@ -2,32 +2,37 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.tools import tool
+from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from pydantic import BaseModel, Field, ValidationError
 from google_api.calendar import create_calendar_events
+from google_api.planner import plan_and_schedule_study_blocks
+from utils.retrieval import format_results
+from utils.tracing import span, estimate_tokens
 import logging
 import json
 import ast
+import os
+import datetime
+import functools
 from typing import Union
+from agents.session_pool import AgentSessionPool
+from agents.tracing_callbacks import TracingCallbackHandler
 
 logger = logging.getLogger(__name__)
 
-calendar_service_agent = None
+class AddToCalendarInput(BaseModel):
+    assignments_to_add: dict = Field(default_factory=dict, description="A dictionary of assignments to add to the calendar. Keys are course names, values are dicts with a 'not_submitted' key holding a list of assignment objects (each with 'title', 'due_date', 'due_time'). Leave empty to add every pending assignment.")
 
-def set_services(gcr_s, cal_s):
-    global calendar_service_agent
-    calendar_service_agent = cal_s
-    if calendar_service_agent:
-        logger.info("SUCCESS: Calendar service initialized in gemini_agent.")
-    else:
-        logger.error("FAILURE: Calendar service is None after set_services call in gemini_agent.")
+class SearchAssignmentsInput(BaseModel):
+    query: str = Field(description="Free-text description of the assignments to look for, e.g. a topic, title words or course name.")
+    k: int = Field(default=5, ge=1, le=20, description="Maximum number of assignments to return.")
 
-class AddToCalendarInput(BaseModel):
-    assignments_to_add: dict = Field(description="A dictionary of assignments to add to the calendar, sourced from the 'structured_assignments_for_calendar' context. Keys are course names, values are dicts with a 'not_submitted' key holding a list of assignment objects (each with 'title', 'due_date', 'due_time').")
+class PlanStudyBlocksInput(BaseModel):
+    block_minutes: int = Field(default=60, ge=15, le=240, description="Length of each study block in minutes.")
+    blocks_per_assignment: int = Field(default=2, ge=1, le=10, description="How many study blocks to plan before each pending assignment.")
 
-@tool(args_schema=AddToCalendarInput, description="Adds provided assignment data to the Google Calendar. Use the structured assignment data provided in the context.")
-def add_assignments_to_google_calendar(assignments_to_add: Union[dict, str]) -> str:
-    global calendar_service_agent
+def _add_assignments_to_calendar(assignments_to_add: Union[dict, str], calendar_service) -> str:
     logger.info(f"Tool add_assignments_to_google_calendar: Raw input type for assignments_to_add: {type(assignments_to_add)}")
     logger.info(f"Tool add_assignments_to_google_calendar: Raw input value (first 500 chars): {str(assignments_to_add)[:500]}")
 
@@ -69,7 +74,7 @@ def add_assignments_to_google_calendar(assignments_to_add: Union[dict, str]) ->
         logger.error(f"Tool: Pydantic validation failed for the (parsed) assignments_to_add data: {ve}")
         return f"Error: The assignment data, even after parsing, does not match the expected structure: {ve}"
 
-    if calendar_service_agent is None:
+    if calendar_service is None:
         logger.error("Tool Error: Google Calendar service not initialized.")
         return "Error: Google Calendar service not initialized for the agent."
     
@@ -78,13 +83,62 @@ def add_assignments_to_google_calendar(assignments_to_add: Union[dict, str]) ->
         return "Error: The assignment data dictionary is effectively empty or invalid."
     
     try:
-        result_message = create_calendar_events(pending_assignments=final_assignments_data, service=calendar_service_agent)
+        assignment_count = sum(len(data.get("not_submitted", [])) for data in final_assignments_data.values() if isinstance(data, dict))
+        with span("calendar.create_events", **{"assignment.count": assignment_count}):
+            result_message = create_calendar_events(pending_assignments=final_assignments_data, service=calendar_service)
         logger.info(f"Tool Success: create_calendar_events returned: {result_message}")
         return f"Calendar update process finished: {result_message}"
     except Exception as e:
         logger.error(f"Tool Error during create_calendar_events: {e}", exc_info=True)
         return f"An error occurred while adding assignments to calendar: {str(e)}"
 
+def _traced_tool(func):
+    """Runs a tool body inside a "tool.<name>" span, so spans opened by the tool's code nest under it."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        input_chars = sum(len(str(value)) for value in list(args) + list(kwargs.values()))
+        with span(f"tool.{func.__name__}", **{"tool.input_chars": input_chars}) as tool_span:
+            output = func(*args, **kwargs)
+            tool_span.set_attribute("tool.output_chars", len(str(output)))
+            return output
+    return wrapper
+
+def build_tools(session):
+    """Returns the agent's tools bound to a single AgentSession."""
+
+    @tool(args_schema=AddToCalendarInput, description="Adds provided assignment data to the Google Calendar. Use the structured assignment data provided in the context.")
+    @_traced_tool
+    def add_assignments_to_google_calendar(assignments_to_add: Union[dict, str] = None) -> str:
+        if not assignments_to_add:
+            assignments_to_add = session.pending_assignments
+        return _add_assignments_to_calendar(assignments_to_add, session.calendar_service)
+
+    @tool(args_schema=SearchAssignmentsInput, description="Searches the user's Google Classroom assignments (titles, descriptions, course names) and returns the most relevant ones with due dates and submission status.")
+    @_traced_tool
+    def search_assignments(query: str, k: int = 5) -> str:
+        results = session.retrieval_index.search(query, k=k)
+        logger.info(f"Tool search_assignments: {len(results)} result(s) for query {query!r}")
+        return format_results(results)
+
+    @tool(args_schema=PlanStudyBlocksInput, description="Plans study blocks in free calendar time before each pending assignment's due date and saves them to Google Calendar.")
+    @_traced_tool
+    def plan_study_blocks_in_calendar(block_minutes: int = 60, blocks_per_assignment: int = 2) -> str:
+        if session.calendar_service is None:
+            logger.error("Tool Error: Google Calendar service not initialized.")
+            return "Error: Google Calendar service not initialized for the agent."
+        try:
+            return plan_and_schedule_study_blocks(
+                session.pending_assignments,
+                session.calendar_service,
+                block_minutes=block_minutes,
+                blocks_per_assignment=blocks_per_assignment,
+            )
+        except Exception as e:
+            logger.error(f"Tool Error during plan_and_schedule_study_blocks: {e}", exc_info=True)
+            return f"An error occurred while planning study blocks: {str(e)}"
+
+    return [add_assignments_to_google_calendar, plan_study_blocks_in_calendar, search_assignments]
+
 LLM_MODEL_NAME = "gemini-1.5-flash"
 
 try:
@@ -98,33 +152,38 @@ except Exception as e:
     logger.error(f"CRITICAL: Failed to initialize LLM: {e}", exc_info=True)
     raise
 
-tools_list = [add_assignments_to_google_calendar]
-
 MEMORY_KEY = "chat_history"
+AGENT_HISTORY_MESSAGES = 20 # Most recent messages passed to the agent as chat_history
 
 # --- CORRECTED SYSTEM PROMPT ---
-# This prompt expects 'input', 'chat_history', 'assignment_context', 'Current Date',
-# and 'structured_assignments_for_calendar' (implicitly available for tool use guidance)
-# It does NOT expect 'Course Name' as a separate top-level variable.
+# This prompt expects 'input', 'chat_history', 'assignment_context' and 'Current Date'.
+# 'assignment_context' is a bounded overview (totals plus the next few due items);
+# details about specific assignments come from the 'search_assignments' tool, so the
+# prompt does not grow with the number of courses.
 prompt = ChatPromptTemplate.from_messages([
     ("system", """You are a helpful Google Classroom and Calendar assistant.
 You will be provided with the Current Date: {Current Date}.
 The user's direct query will be in '{input}'.
-Context about their assignments will be in '{assignment_context}'.
-Structured data for calendar operations is available under 'structured_assignments_for_calendar' in the input dictionary.
+An overview of their assignments (totals and the next few due items) will be in '{assignment_context}'.
 
 Instructions:
-1.  Use the '{assignment_context}' and '{Current Date}' to answer questions about assignments (e.g., "what are my assignments?", "what's due today?", "what was due yesterday?").
+1.  Use the '{assignment_context}' and '{Current Date}' to answer questions about upcoming assignments (e.g., "what's due next?", "what's due today?").
+    For anything else about specific assignments (a topic, a title, a course, something due on another date), use the 'search_assignments' tool
+    and answer from its results. Do not guess assignments that are not in the overview or the search results.
     When referencing the current day, use the '{Current Date}' provided.
     If you are answering from the context, you can say so. For example: "Based on your last fetched assignments and today's date ({Current Date}): ..."
 
 2.  If the user asks to add assignments to the calendar, you MUST use the 'add_assignments_to_google_calendar' tool.
-    When you decide to call this tool, the 'assignments_to_add' argument for the tool MUST BE EXACTLY the content of the 'structured_assignments_for_calendar' variable that is provided to you in the overall input.
+    To add every pending assignment, call it without 'assignments_to_add'. To add only some, pass just those assignments.
     The tool expects 'assignments_to_add' as a JSON dictionary object. Do NOT provide it as a string.
     Example of the structure for 'assignments_to_add':
     {{"Course Name 1": {{"not_submitted": [{{"title": "HW1", "due_date": "YYYY-MM-DD", "due_time": "HH:MM"}}]}}, "Course Name 2": ...}}
 
-Assignment Summary Context to refer to:
+3.  If the user asks to plan or schedule study time, use the 'plan_study_blocks_in_calendar' tool.
+    It already knows the user's pending assignments and free time; only pass 'block_minutes' and
+    'blocks_per_assignment' if the user asked for specific values.
+
+Assignment overview to refer to:
 {assignment_context}
 """),
     MessagesPlaceholder(variable_name=MEMORY_KEY), # For conversational history
@@ -133,24 +192,65 @@ Assignment Summary Context to refer to:
 ])
 # --- END OF CORRECTED SYSTEM PROMPT ---
 
-try:
-    # create_tool_calling_agent will build the runnable that passes the correct inputs to the prompt
-    agent_runnable = create_tool_calling_agent(llm, tools_list, prompt)
-    logger.info("Agent runnable created successfully using create_tool_calling_agent.")
-
-    agent_executor = AgentExecutor(
-        agent=agent_runnable,
-        tools=tools_list,
-        verbose=True,
-        handle_parsing_errors="I encountered an issue processing that request. Please try rephrasing. (Agent Error)",
-        max_iterations=5,
-        return_intermediate_steps=True
-    )
-    logger.info("Agent executor initialized with create_tool_calling_agent.")
+def build_agent_executor(session):
+    """
+    Builds an AgentExecutor whose tools act on behalf of the given session only.
+    The LLM and prompt are shared; they hold no per-user state.
+    """
+    try:
+        session_tools = build_tools(session)
+        # create_tool_calling_agent will build the runnable that passes the correct inputs to the prompt
+        agent_runnable = create_tool_calling_agent(llm, session_tools, prompt)
 
-except ImportError as ie:
-    logger.error(f"ImportError: Failed to import create_tool_calling_agent. Error: {ie}", exc_info=True)
-    raise
-except Exception as e:
-    logger.error(f"CRITICAL: Failed to initialize agent executor: {e}", exc_info=True)
-    raise
\ No newline at end of file
+        executor = AgentExecutor(
+            agent=agent_runnable,
+            tools=session_tools,
+            verbose=True,
+            handle_parsing_errors="I encountered an issue processing that request. Please try rephrasing. (Agent Error)",
+            max_iterations=5,
+            return_intermediate_steps=True
+        )
+        logger.info(f"Agent executor initialized for session {session.session_id}.")
+        return executor
+    except Exception as e:
+        logger.error(f"CRITICAL: Failed to initialize agent executor for session {session.session_id}: {e}", exc_info=True)
+        raise
+
+def build_agent_payload(user_query, chat_messages, retrieval_index):
+    """
+    Input for one chat turn: the query, the most recent chat messages ({"type", "content"}
+    dicts) as LangChain history, and a bounded overview of the session's assignments.
+    """
+    # Only the most recent turns go to the agent, so prompt cost stays flat in long sessions
+    history = []
+    for msg_data in chat_messages[-AGENT_HISTORY_MESSAGES:]:
+        if msg_data["type"] == "human":
+            history.append(HumanMessage(content=msg_data["content"]))
+        elif msg_data["type"] == "ai":
+            history.append(AIMessage(content=msg_data["content"]))
+    return {
+        "input": user_query, # User's direct query
+        MEMORY_KEY: history,
+        # Bounded overview only; the agent pulls specific items through search_assignments
+        "assignment_context": retrieval_index.overview(datetime.datetime.now()),
+        "Current Date": datetime.date.today().strftime("%Y-%m-%d"), # Passed as a separate key
+    }
+
+def invoke_agent(session, payload):
+    """Runs one chat turn on the session's executor inside an "agent.invoke" tracing span."""
+    with span("agent.invoke", **{
+        "session.id": session.session_id,
+        "chat_history.messages": len(payload.get(MEMORY_KEY, [])),
+        "input.tokens_estimate": estimate_tokens(payload.get("input", "")),
+        "context.tokens_estimate": estimate_tokens(payload.get("assignment_context", "")),
+    }) as invoke_span:
+        result = session.executor.invoke(payload, config={"callbacks": [TracingCallbackHandler(parent=invoke_span)]})
+        invoke_span.set_attribute("output.tokens_estimate", estimate_tokens(str(result.get("output", ""))))
+        return result
+
+# One pool per process: each Streamlit session gets its own executor and tool bindings.
+session_pool = AgentSessionPool(
+    executor_factory=build_agent_executor,
+    max_sessions=int(os.environ.get("AGENT_MAX_SESSIONS", "50")),
+    idle_ttl_seconds=int(os.environ.get("AGENT_SESSION_IDLE_TTL", "1800")),
+)
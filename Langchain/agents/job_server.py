@@ -0,0 +1,299 @@
+# agents/job_server.py
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class AgentJob:
+    """A unit of agent work: a callable plus its arguments, status and result."""
+
+    def __init__(self, fn, args, kwargs, owner=None):
+        self.job_id = uuid.uuid4().hex
+        self.owner = owner
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # Runs in the submitter's context, so e.g. tracing spans started by the job nest under the caller's
+        self.context = contextvars.copy_context()
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self.done = threading.Event()
+
+    def to_dict(self):
+        """Public view of the job: only the agent's answer, never its inputs (history, assignment data)."""
+        output = self.result.get("output") if isinstance(self.result, dict) else None
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "output": output,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class AgentJobServer:
+    """
+    Local job queue with a pool of worker threads for agent calls.
+    LLM calls are I/O bound, so threads give real concurrency here and keep the
+    job's session objects (services, indexes) shareable without pickling.
+    Worker count and queue size are independent of how many UI sessions exist.
+    """
+
+    def __init__(self, workers=4, max_queue=100, result_ttl_seconds=600):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl_seconds = result_ttl_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._busy = 0
+        self._counters = {"submitted": 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0, "rejected": 0}
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"agent-job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Agent job server started with {self.workers} worker(s), queue size {self.max_queue}.")
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def submit(self, fn, *args, owner=None, **kwargs):
+        """Queues fn(*args, **kwargs) and returns its job id. Raises JobQueueFull when saturated."""
+        self.start()
+        job = AgentJob(fn, args, kwargs, owner=owner)
+        with self._lock:
+            self._purge_finished_locked()
+            self._jobs[job.job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+                self._counters["rejected"] += 1
+            raise JobQueueFull(f"Agent job queue is full ({self.max_queue} jobs waiting).")
+        with self._lock:
+            self._counters["submitted"] += 1
+        return job.job_id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until the job finishes or timeout elapses; returns the job (or None if unknown)."""
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. Queued jobs never run; a running job's result is discarded
+        when it returns, since an in-flight LLM call cannot be interrupted.
+        Returns False if the job is unknown or already finished.
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job.cancel_requested.set()
+        return True
+
+    def metrics(self):
+        with self._lock:
+            finished = self._counters[SUCCEEDED] + self._counters[FAILED]
+            return {
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "tracked_jobs": len(self._jobs),
+                **self._counters,
+                "avg_wait_ms": round(1000 * self._total_wait / finished, 1) if finished else 0.0,
+                "avg_run_ms": round(1000 * self._total_run / finished, 1) if finished else 0.0,
+            }
+
+    def _finish(self, job, status, result=None, error=None):
+        job.finished_at = time.time()
+        job.status = status
+        job.result = result
+        job.error = error
+        # Drop references to the payload; only the outcome is kept for polling.
+        job.fn = job.args = job.kwargs = job.context = None
+        with self._lock:
+            self._counters[status] += 1
+            if job.started_at is not None and status != CANCELLED:
+                self._total_wait += job.started_at - job.created_at
+                self._total_run += job.finished_at - job.started_at
+        job.done.set()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            if job.cancel_requested.is_set():
+                self._finish(job, CANCELLED)
+                continue
+
+            job.status = RUNNING
+            job.started_at = time.time()
+            with self._lock:
+                self._busy += 1
+            try:
+                result = job.context.run(job.fn, *job.args, **job.kwargs)
+            except Exception as e:
+                logger.error(f"Agent job {job.job_id} failed: {e}", exc_info=True)
+                outcome = (FAILED, None, str(e))
+            else:
+                outcome = (SUCCEEDED, result, None)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+            if job.cancel_requested.is_set():
+                outcome = (CANCELLED, None, None)
+            self._finish(job, *outcome)
+
+    def _purge_finished_locked(self):
+        cutoff = time.time() - self.result_ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in FINISHED_STATES and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def _make_handler(server):
+    class JobStatusHandler(BaseHTTPRequestHandler):
+        """
+        Read-only JSON status API so other processes (e.g. Django) can poll jobs:
+        GET /metrics, GET /jobs/<id>?owner=<owner>[&wait=seconds], POST /jobs/<id>/cancel?owner=<owner>
+        Jobs are only visible to their owner; any other owner gets the same 404 as an unknown id.
+        """
+
+        def _owned_job(self, job_id, query):
+            owner = parse_qs(query).get("owner", [""])[0]
+            job = server.get(job_id)
+            if job is None or not owner or job.owner != owner:
+                return None
+            return job
+
+        def _send(self, status_code, payload):
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            if parts == ["metrics"]:
+                return self._send(200, server.metrics())
+            if len(parts) == 2 and parts[0] == "jobs":
+                job = self._owned_job(parts[1], url.query)
+                if job is None:
+                    return self._send(404, {"error": "Unknown job id."})
+                wait = parse_qs(url.query).get("wait", ["0"])[0]
+                try:
+                    wait = min(float(wait), 30.0)
+                except ValueError:
+                    wait = 0.0
+                if wait > 0:
+                    job.done.wait(wait)
+                return self._send(200, job.to_dict())
+            self._send(404, {"error": "Not found."})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                if self._owned_job(parts[1], url.query) is None:
+                    return self._send(404, {"error": "Unknown job id."})
+                return self._send(200, {"job_id": parts[1], "cancelled": server.cancel(parts[1])})
+            self._send(404, {"error": "Not found."})
+
+        def log_message(self, format, *args):
+            logger.debug(f"job status API: {format % args}")
+
+    return JobStatusHandler
+
+
+def serve_http(server, host="127.0.0.1", port=8765):
+    """Starts the JSON status API for `server` on a daemon thread and returns the HTTP server."""
+    httpd = ThreadingHTTPServer((host, port), _make_handler(server))
+    thread = threading.Thread(target=httpd.serve_forever, name="agent-job-http", daemon=True)
+    thread.start()
+    logger.info(f"Agent job status API listening on http://{host}:{port}")
+    return httpd
+
+
+_job_server = None
+_job_server_lock = threading.Lock()
+
+
+def get_job_server():
+    """
+    Process-wide job server, configured from the environment:
+    AGENT_JOB_WORKERS, AGENT_JOB_QUEUE_MAX, AGENT_JOB_RESULT_TTL and, to expose the
+    status API, AGENT_JOB_HTTP_PORT (plus optional AGENT_JOB_HTTP_HOST).
+    """
+    global _job_server
+    with _job_server_lock:
+        if _job_server is None:
+            _job_server = AgentJobServer(
+                workers=int(os.environ.get("AGENT_JOB_WORKERS", "4")),
+                max_queue=int(os.environ.get("AGENT_JOB_QUEUE_MAX", "100")),
+                result_ttl_seconds=int(os.environ.get("AGENT_JOB_RESULT_TTL", "600")),
+            )
+            _job_server.start()
+            http_port = os.environ.get("AGENT_JOB_HTTP_PORT")
+            if http_port:
+                try:
+                    serve_http(_job_server, os.environ.get("AGENT_JOB_HTTP_HOST", "127.0.0.1"), int(http_port))
+                except OSError as e:
+                    logger.error(f"Could not start agent job status API on port {http_port}: {e}")
+        return _job_server
@@ -0,0 +1,111 @@
+# agents/session_pool.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from utils.retrieval import AssignmentIndex
+
+logger = logging.getLogger(__name__)
+
+
+class AgentSession:
+    """
+    Per-user state the agent's tools are bound to.
+    Tools read attributes off the session at call time, so swapping the calendar
+    service after a re-login does not require rebuilding the executor.
+    """
+
+    def __init__(self, session_id, calendar_service=None):
+        self.session_id = session_id
+        self.calendar_service = calendar_service
+        self.pending_assignments = {}
+        self.retrieval_index = AssignmentIndex()
+        self.executor = None
+        self.last_used = time.monotonic()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class AgentSessionPool:
+    """
+    Bounded, thread-safe pool of AgentSession objects keyed by session id.
+    Least-recently-used sessions are evicted once max_sessions is exceeded, and
+    sessions idle for longer than idle_ttl_seconds are dropped on access.
+    """
+
+    def __init__(self, executor_factory, max_sessions=50, idle_ttl_seconds=1800):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.executor_factory = executor_factory
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, calendar_service=None):
+        """
+        Returns the session for session_id, creating it (and its executor) if needed.
+        A non-None calendar_service replaces the one currently bound to the session.
+        """
+        with self._lock:
+            self._evict_idle_locked()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                if calendar_service is not None:
+                    session.calendar_service = calendar_service
+                session.touch()
+                return session
+
+        # Build outside the lock: executor construction should not stall other sessions.
+        new_session = AgentSession(session_id, calendar_service)
+        new_session.executor = self.executor_factory(new_session)
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = new_session
+                self._sessions[session_id] = session
+                logger.info(f"Agent session created: {session_id} (pool size {len(self._sessions)})")
+            elif calendar_service is not None:
+                session.calendar_service = calendar_service
+            self._sessions.move_to_end(session_id)
+            session.touch()
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                logger.info(f"Agent session evicted (LRU): {evicted_id}")
+            return session
+
+    def discard(self, session_id):
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None:
+                logger.info(f"Agent session discarded: {session_id}")
+
+    def evict_idle(self):
+        with self._lock:
+            return self._evict_idle_locked()
+
+    def _evict_idle_locked(self):
+        if not self.idle_ttl_seconds:
+            return 0
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        evicted = 0
+        # OrderedDict is kept in LRU order, so idle sessions are always at the front.
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+            evicted += 1
+            logger.info(f"Agent session evicted (idle): {session_id}")
+        return evicted
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
@@ -0,0 +1,57 @@
+# agents/tracing_callbacks.py
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utils.tracing import estimate_tokens, get_tracer
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Opens a utils.tracing span for every LLM call the agent makes, under `parent`
+    (the agent.invoke span), so a chat turn's trace shows time spent in Gemini.
+    Callbacks may run in a different context from the one that invoked the agent,
+    so spans get explicit parents instead of going through the current-span ContextVar.
+    Tool calls are traced by the tools themselves (see gemini_agent.build_tools), so
+    spans opened inside a tool nest under it.
+    """
+
+    def __init__(self, parent=None):
+        self._parent = parent
+        self._spans = {} # run_id -> span
+
+    def _start(self, run_id, parent_run_id, name, **attributes):
+        parent = self._spans.get(parent_run_id, self._parent)
+        self._spans[run_id] = get_tracer().start_span(name, parent=parent, **attributes)
+
+    def _end(self, run_id, error=None):
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return None
+        if error is not None:
+            span.record_error(error)
+        span.end()
+        return span
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        prompt_text = "".join(str(m.content) for batch in messages for m in batch)
+        self._start(run_id, parent_run_id, "llm.chat", **{
+            "llm.model": (kwargs.get("invocation_params") or {}).get("model", ""),
+            "llm.messages": sum(len(batch) for batch in messages),
+            "llm.input_tokens_estimate": estimate_tokens(prompt_text),
+        })
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._spans.get(run_id)
+        if span is not None:
+            usage = {}
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    for key, value in (getattr(message, "usage_metadata", None) or {}).items():
+                        if isinstance(value, int):
+                            usage[key] = usage.get(key, 0) + value
+            # Token counts reported by the model, when it reports them
+            span.set_attributes(**{f"llm.{key}": value for key, value in usage.items()})
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
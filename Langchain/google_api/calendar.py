@@ -2,6 +2,8 @@
 # Make sure this file exists in a 'google_api' subfolder or adjust imports
 import datetime
 
+from utils.tracing import span
+
 def create_calendar_events(pending_assignments, service):
     if not service:
         raise ValueError("Calendar service object is None in create_calendar_events")
@@ -52,7 +54,8 @@ def create_calendar_events(pending_assignments, service):
                 },
             }
             try:
-                service.events().insert(calendarId="primary", body=event).execute()
+                with span("calendar.events.insert"):
+                    service.events().insert(calendarId="primary", body=event).execute()
                 event_creation_summary.append(f"Successfully added '{title}' for course '{course}' to calendar.")
             except Exception as e:
                 event_creation_summary.append(f"Failed to add '{title}' for course '{course}' to calendar: {e}")
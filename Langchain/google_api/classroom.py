@@ -1,37 +1,119 @@
 # google_api/classroom.py
+from utils.tracing import span
 
-def get_coursework_with_submissions(service):
+SUBMITTED_STATES = {"TURNED_IN", "RETURNED"}
+
+
+def fetch_course_items(service, course_id, course_name):
     """
-    Fetches all Google Classroom assignments and returns a human-readable string summary.
+    Fetches one course's coursework and the user's submission state for each item.
+    Returns a list of snapshot items (see fetch_coursework_snapshot).
+    """
+    with span("classroom.course", **{"course.id": course_id}) as course_span:
+        with span("classroom.coursework.list", **{"course.id": course_id}):
+            coursework_result = service.courses().courseWork().list(courseId=course_id).execute()
+        coursework_items = coursework_result.get("courseWork", [])
+
+        items = []
+        for work in coursework_items:
+            items.append(fetch_coursework_item(service, course_id, course_name, work))
+        course_span.set_attribute("item.count", len(items))
+        return items
+
+
+def fetch_coursework_item(service, course_id, course_name, work):
+    """Builds a snapshot item for a single courseWork resource, fetching its submission state."""
+    work_id = work["id"]
+    with span("classroom.submissions.list", **{"course.id": course_id, "coursework.id": work_id}):
+        submission_result = service.courses().courseWork().studentSubmissions().list(
+            courseId=course_id,
+            courseWorkId=work_id,
+            userId="me"
+        ).execute()
+    submissions = submission_result.get("studentSubmissions", [])
+
+    state = None
+    if submissions and isinstance(submissions, list) and len(submissions) > 0 and isinstance(submissions[0], dict):
+        state = submissions[0].get("state")
+
+    return {
+        "key": f"{course_id}/{work_id}",
+        "course_id": course_id,
+        "course_name": course_name,
+        "coursework_id": work_id,
+        "title": work.get("title", "No Title"),
+        "description": work.get("description", ""),
+        "due_date": work.get("dueDate", {}),
+        "due_time": work.get("dueTime", {}),
+        "update_time": work.get("updateTime"),
+        "state": state,
+    }
+
+
+def fetch_coursework_snapshot(service):
+    """
+    Lists every course, its coursework and the user's submission state in one pass.
+    Output: {"courses": [{"id": ..., "name": ...}], "items": [snapshot item, ...]}
+    Both the human-readable summary and the calendar structure are derived from this,
+    so a refresh only walks the Classroom API once.
     """
     if not service:
-        raise ValueError("Classroom service object is None in get_coursework_with_submissions")
+        raise ValueError("Classroom service object is None in fetch_coursework_snapshot")
 
-    results = service.courses().list(pageSize=20).execute()
-    courses = results.get("courses", [])
-    coursework_summary_parts = []
+    with span("classroom.snapshot") as snapshot_span:
+        with span("classroom.courses.list"):
+            results = service.courses().list(pageSize=20).execute()
+        courses = results.get("courses", [])
 
-    if not courses:
-        return "No courses found in your Google Classroom."
+        snapshot = {"courses": [], "items": []}
+        for course in courses:
+            snapshot["courses"].append({"id": course["id"], "name": course["name"]})
+            snapshot["items"].extend(fetch_course_items(service, course["id"], course["name"]))
+        snapshot_span.set_attributes(**{"course.count": len(snapshot["courses"]), "item.count": len(snapshot["items"])})
+        return snapshot
 
-    for course in courses:
-        course_id = course["id"]
-        course_name = course["name"]
 
-        coursework_result = service.courses().courseWork().list(courseId=course_id).execute()
-        coursework_items = coursework_result.get("courseWork", [])
+def process_snapshot(snapshot, assignment_index):
+    """
+    Derives everything a refresh produces from one snapshot: syncs `assignment_index` and
+    returns (summary, pending, changed index items); see summarize_snapshot and pending_from_snapshot.
+    """
+    with span("refresh.summarize"):
+        summary = summarize_snapshot(snapshot)
+    with span("refresh.pending"):
+        pending = pending_from_snapshot(snapshot)
+    with span("refresh.index_sync", **{"item.count": len(snapshot["items"])}) as index_span:
+        changed = assignment_index.sync(snapshot["items"])
+        index_span.set_attribute("item.changed", changed)
+    return summary, pending, changed
+
+
+def _items_by_course(snapshot):
+    grouped = {}
+    for item in snapshot["items"]:
+        grouped.setdefault(item["course_id"], []).append(item)
+    return grouped
+
+
+def summarize_snapshot(snapshot):
+    """Human-readable Markdown summary of a coursework snapshot."""
+    if not snapshot["courses"]:
+        return "No courses found in your Google Classroom."
+
+    grouped = _items_by_course(snapshot)
+    coursework_summary_parts = []
 
-        if not coursework_items:
+    for course in snapshot["courses"]:
+        course_items = grouped.get(course["id"], [])
+        if not course_items:
             continue
 
         submitted_for_course = []
         not_submitted_for_course = []
 
-        for work in coursework_items:
-            work_id = work["id"]
-            title = work.get("title", "No Title")
-            due_date_obj = work.get("dueDate", {})
-            due_time_obj = work.get("dueTime", {})
+        for item in course_items:
+            due_date_obj = item["due_date"]
+            due_time_obj = item["due_time"]
 
             date_str = "N/A"
             if due_date_obj and due_date_obj.get('year') and due_date_obj.get('month') and due_date_obj.get('day'):
@@ -41,31 +123,23 @@ def get_coursework_with_submissions(service):
             if due_time_obj and due_time_obj.get('hours') is not None:
                  time_str = f"{due_time_obj.get('hours', 0):02d}:{due_time_obj.get('minutes', 0):02d}"
 
-            submission_result = service.courses().courseWork().studentSubmissions().list(
-                courseId=course_id,
-                courseWorkId=work_id,
-                userId="me"
-            ).execute()
-            submissions = submission_result.get("studentSubmissions", [])
-            
             current_status = "Status: NOT_SUBMITTED (or no submission object)"
             is_submitted_flag = False
 
-            if submissions and isinstance(submissions, list) and len(submissions) > 0 and isinstance(submissions[0], dict):
-                sub_state = submissions[0].get("state")
-                if sub_state:
-                    current_status = f"Status: {sub_state}"
-                    if sub_state in {"TURNED_IN", "RETURNED"}:
-                        is_submitted_flag = True
-            
-            assignment_details = f"- {title} | Due: {date_str} at {time_str} | {current_status}"
+            sub_state = item["state"]
+            if sub_state:
+                current_status = f"Status: {sub_state}"
+                if sub_state in SUBMITTED_STATES:
+                    is_submitted_flag = True
+
+            assignment_details = f"- {item['title']} | Due: {date_str} at {time_str} | {current_status}"
             if is_submitted_flag:
                 submitted_for_course.append(assignment_details)
             else:
                 not_submitted_for_course.append(assignment_details)
 
         if submitted_for_course or not_submitted_for_course:
-            course_summary = f"\n📘 **{course_name}**\n"
+            course_summary = f"\n📘 **{course['name']}**\n"
             if submitted_for_course:
                 course_summary += "\n✅ Submitted Assignments:\n" + "\n".join(submitted_for_course)
             if not_submitted_for_course:
@@ -78,40 +152,20 @@ def get_coursework_with_submissions(service):
     return "\n\n".join(coursework_summary_parts)
 
 
-def get_pending_assignments_for_calendar(service):
+def pending_from_snapshot(snapshot):
     """
-    Fetches Google Classroom assignments that are not submitted and have due dates,
-    returning them as structured data suitable for adding to a calendar.
+    Not-submitted assignments with due dates, structured for adding to a calendar.
     Output: {"Course Name": {"not_submitted": [{"title": ..., "due_date": ..., "due_time": ...}]}}
-            or an empty dict {} if no such assignments or an error.
     """
-    if not service:
-        raise ValueError("Classroom service object is None in get_pending_assignments_for_calendar")
-    
-    results = service.courses().list(pageSize=20).execute()
-    courses = results.get("courses", [])
+    grouped = _items_by_course(snapshot)
     pending_assignments_data = {}
 
-    if not courses:
-        return {}
-
-    for course in courses:
-        course_id = course["id"]
-        course_name = course["name"]
-
-        coursework_result = service.courses().courseWork().list(courseId=course_id).execute()
-        coursework_items = coursework_result.get("courseWork", [])
-
-        if not coursework_items:
-            continue
-
+    for course in snapshot["courses"]:
         course_not_submitted_list = []
 
-        for work in coursework_items:
-            work_id = work["id"]
-            title = work.get("title", "No Title")
-            due_date_obj = work.get("dueDate", {})
-            due_time_obj = work.get("dueTime", {})
+        for item in grouped.get(course["id"], []):
+            due_date_obj = item["due_date"]
+            due_time_obj = item["due_time"]
 
             year = due_date_obj.get('year')
             month = due_date_obj.get('month')
@@ -125,27 +179,35 @@ def get_pending_assignments_for_calendar(service):
             minutes = due_time_obj.get('minutes', 59)
             time_str = f"{hours:02d}:{minutes:02d}"
 
-            submission_result = service.courses().courseWork().studentSubmissions().list(
-                courseId=course_id,
-                courseWorkId=work_id,
-                userId="me"
-            ).execute()
-            submissions = submission_result.get("studentSubmissions", [])
-            
-            is_submitted = False
-            if submissions and isinstance(submissions, list) and len(submissions) > 0 and isinstance(submissions[0], dict):
-                sub_state = submissions[0].get("state")
-                if sub_state and sub_state in {"TURNED_IN", "RETURNED"}:
-                    is_submitted = True
-            
-            if not is_submitted:
+            if item["state"] not in SUBMITTED_STATES:
                 course_not_submitted_list.append({
-                    "title": title,
+                    "title": item["title"],
                     "due_date": date_str,
                     "due_time": time_str
                 })
 
         if course_not_submitted_list:
-            pending_assignments_data[course_name] = {"not_submitted": course_not_submitted_list}
+            pending_assignments_data[course["name"]] = {"not_submitted": course_not_submitted_list}
             
-    return pending_assignments_data
\ No newline at end of file
+    return pending_assignments_data
+
+
+def get_coursework_with_submissions(service):
+    """
+    Fetches all Google Classroom assignments and returns a human-readable string summary.
+    """
+    if not service:
+        raise ValueError("Classroom service object is None in get_coursework_with_submissions")
+    return summarize_snapshot(fetch_coursework_snapshot(service))
+
+
+def get_pending_assignments_for_calendar(service):
+    """
+    Fetches Google Classroom assignments that are not submitted and have due dates,
+    returning them as structured data suitable for adding to a calendar.
+    Output: {"Course Name": {"not_submitted": [{"title": ..., "due_date": ..., "due_time": ...}]}}
+            or an empty dict {} if no such assignments or an error.
+    """
+    if not service:
+        raise ValueError("Classroom service object is None in get_pending_assignments_for_calendar")
+    return pending_from_snapshot(fetch_coursework_snapshot(service))
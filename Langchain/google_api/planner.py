@@ -0,0 +1,262 @@
+# google_api/planner.py
+import datetime
+import hashlib
+import logging
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from utils.intervals import IntervalIndex
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+TIME_ZONE = "Asia/Karachi" # Keep in sync with google_api/calendar.py
+FREEBUSY_WINDOW_DAYS = 90 # Longest range requested per freebusy query
+BATCH_LIMIT = 50 # Max calls the Calendar API accepts in one batch request
+MAX_HORIZON_DAYS = 180
+PLANNER_PROPERTY = "studyPlanner" # Private extendedProperty marking events this module created
+BLOCK_KEY_PROPERTY = "studyBlockKey" # Private extendedProperty naming the assignment a block is for
+
+
+def _parse_due(assignment, tz):
+    """Mirrors create_calendar_events: missing/invalid time means end of day."""
+    date_str = assignment.get("due_date")
+    if not date_str or date_str == "N/A":
+        return None
+    time_str = assignment.get("due_time")
+    if not time_str or time_str == "N/A" or ':' not in time_str:
+        time_str = "23:59"
+    try:
+        due = datetime.datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        try:
+            due = datetime.datetime.strptime(date_str, "%Y-%m-%d").replace(hour=12, minute=0)
+        except ValueError:
+            return None
+    return due.replace(tzinfo=tz)
+
+
+def _parse_rfc3339(value):
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def study_block_key(course, title, due):
+    """Stable id of the assignment a study block belongs to (extendedProperty values are length-limited)."""
+    return hashlib.sha1(f"{course}\0{title}\0{due.isoformat()}".encode("utf-8")).hexdigest()[:20]
+
+
+def fetch_existing_blocks(service, time_min, time_max, calendar_id="primary"):
+    """
+    Study blocks created by earlier runs between time_min and time_max, found by their private
+    extendedProperty. Returns {study_block_key: set of block start dates}.
+    """
+    existing = {}
+    page_token = None
+    while True:
+        result = service.events().list(
+            calendarId=calendar_id,
+            privateExtendedProperty=f"{PLANNER_PROPERTY}=1",
+            timeMin=time_min.isoformat(),
+            timeMax=time_max.isoformat(),
+            singleEvents=True,
+            pageToken=page_token,
+        ).execute()
+        for event in result.get("items", []):
+            key = (event.get("extendedProperties", {}).get("private", {})).get(BLOCK_KEY_PROPERTY)
+            start = (event.get("start") or {}).get("dateTime")
+            if key and start and event.get("status") != "cancelled":
+                existing.setdefault(key, set()).add(_parse_rfc3339(start).date())
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return existing
+
+
+def fetch_busy_index(service, time_min, time_max, calendar_id="primary", time_zone=TIME_ZONE):
+    """
+    Loads busy time over [time_min, time_max) into an IntervalIndex using freebusy.query.
+    One API call per FREEBUSY_WINDOW_DAYS of horizon (a semester is one or two calls).
+    """
+    if not service:
+        raise ValueError("Calendar service object is None in fetch_busy_index")
+
+    busy = []
+    window_start = time_min
+    while window_start < time_max:
+        window_end = min(time_max, window_start + datetime.timedelta(days=FREEBUSY_WINDOW_DAYS))
+        body = {
+            "timeMin": window_start.isoformat(),
+            "timeMax": window_end.isoformat(),
+            "timeZone": time_zone,
+            "items": [{"id": calendar_id}],
+        }
+        result = service.freebusy().query(body=body).execute()
+        calendar_info = result.get("calendars", {}).get(calendar_id, {})
+        for error in calendar_info.get("errors", []):
+            logger.warning(f"freebusy error for {calendar_id}: {error}")
+        for period in calendar_info.get("busy", []):
+            busy.append((_parse_rfc3339(period["start"]), _parse_rfc3339(period["end"])))
+        window_start = window_end
+
+    return IntervalIndex(busy)
+
+
+def plan_study_blocks(pending_assignments, busy_index, now, block_minutes=60, blocks_per_assignment=2,
+                      day_start=datetime.time(9, 0), day_end=datetime.time(21, 0), time_zone=TIME_ZONE,
+                      horizon_end=None, existing_blocks=None):
+    """
+    Greedy earliest-deadline-first allocation of study blocks into free time.
+    pending_assignments uses the get_pending_assignments_for_calendar structure.
+    Each assignment gets at most one block per day, placed in the earliest free gap
+    inside the [day_start, day_end) window and before its due time. busy_index is
+    updated in place so later assignments never overlap earlier blocks.
+    Blocks are never placed after horizon_end (the end of the busy data), and
+    existing_blocks ({study_block_key: dates}, see fetch_existing_blocks) count
+    towards an assignment's blocks, on their days.
+    Returns (planned_blocks, shortfalls) where shortfalls lists assignments that
+    could not get all their blocks.
+    """
+    tz = ZoneInfo(time_zone)
+    now = now.astimezone(tz)
+    block = datetime.timedelta(minutes=block_minutes)
+
+    queue = []
+    for course, data in (pending_assignments or {}).items():
+        for assignment in data.get("not_submitted", []):
+            due = _parse_due(assignment, tz)
+            if due is None or due <= now:
+                continue
+            queue.append((due, course, assignment.get("title", "Untitled Assignment")))
+    queue.sort(key=lambda item: item[0])
+
+    planned = []
+    shortfalls = []
+    for due, course, title in queue:
+        key = study_block_key(course, title, due)
+        used_days = set((existing_blocks or {}).get(key, ()))
+        placed = len(used_days)
+        # Study time after the horizon would be planned without knowing what is busy there
+        last = due if horizon_end is None else min(due, horizon_end)
+        day = now.date()
+        while placed < blocks_per_assignment and day <= last.date():
+            if day in used_days:
+                day += datetime.timedelta(days=1)
+                continue
+            window_start = max(now, datetime.datetime.combine(day, day_start, tzinfo=tz))
+            window_end = min(last, datetime.datetime.combine(day, day_end, tzinfo=tz))
+            for gap_start, gap_end in busy_index.free_slots(window_start, window_end):
+                if gap_end - gap_start >= block:
+                    busy_index.add(gap_start, gap_start + block)
+                    planned.append({
+                        "course": course,
+                        "title": title,
+                        "start": gap_start,
+                        "end": gap_start + block,
+                        "due": due,
+                        "key": key,
+                    })
+                    placed += 1
+                    break
+            day += datetime.timedelta(days=1)
+        if placed < blocks_per_assignment:
+            shortfalls.append({"course": course, "title": title, "due": due,
+                               "missing_blocks": blocks_per_assignment - placed})
+
+    return planned, shortfalls
+
+
+def write_study_blocks(service, planned_blocks, calendar_id="primary", time_zone=TIME_ZONE):
+    """
+    Inserts all planned blocks with batched events.insert calls (BATCH_LIMIT per request).
+    Returns the number of events that failed to insert; a batch request that fails as a
+    whole counts all of its blocks and the remaining batches are still sent.
+    """
+    if not service:
+        raise ValueError("Calendar service object is None in write_study_blocks")
+
+    failures = []
+    failed_batch_blocks = 0
+
+    def _callback(request_id, response, exception):
+        if exception is not None:
+            failures.append((request_id, exception))
+
+    for offset in range(0, len(planned_blocks), BATCH_LIMIT):
+        chunk = planned_blocks[offset:offset + BATCH_LIMIT]
+        batch = service.new_batch_http_request(callback=_callback)
+        for block in chunk:
+            event = {
+                "summary": f"📚 Study: [{block['course']}] {block['title']}",
+                "description": f"Study block planned before the due date ({block['due'].strftime('%Y-%m-%d %H:%M')}).",
+                "start": {"dateTime": block["start"].isoformat(), "timeZone": time_zone},
+                "end": {"dateTime": block["end"].isoformat(), "timeZone": time_zone},
+                # Lets later runs find this block instead of planning the assignment again
+                "extendedProperties": {"private": {PLANNER_PROPERTY: "1", BLOCK_KEY_PROPERTY: block["key"]}},
+            }
+            batch.add(service.events().insert(calendarId=calendar_id, body=event))
+        try:
+            batch.execute()
+        except HttpError as e:
+            # The whole batch request was rejected; earlier batches are already written
+            logger.error(f"Failed to insert {len(chunk)} study block(s) (batch starting at block {offset}): {e}")
+            failed_batch_blocks += len(chunk)
+
+    for request_id, exception in failures:
+        logger.error(f"Failed to insert study block (batch request {request_id}): {exception}")
+    return len(failures) + failed_batch_blocks
+
+
+def plan_and_schedule_study_blocks(pending_assignments, service, block_minutes=60, blocks_per_assignment=2,
+                                   horizon_days=MAX_HORIZON_DAYS, now=None):
+    """
+    Plans study blocks before every pending assignment and writes them to the calendar.
+    Blocks from earlier runs are kept and count towards each assignment, so running it
+    again only fills in what is missing. Nothing is planned past the horizon.
+    Returns a short human-readable summary, like create_calendar_events.
+    """
+    if not pending_assignments or not isinstance(pending_assignments, dict):
+        return "No pending assignments to plan study time for."
+
+    tz = ZoneInfo(TIME_ZONE)
+    now = (now or datetime.datetime.now(tz)).astimezone(tz)
+    due_dates = [
+        due for data in pending_assignments.values()
+        for due in (_parse_due(a, tz) for a in data.get("not_submitted", []))
+        if due is not None and due > now
+    ]
+    if not due_dates:
+        return "No upcoming due dates to plan study time for."
+    horizon_end = min(max(due_dates), now + datetime.timedelta(days=horizon_days))
+
+    with span("calendar.freebusy", **{"horizon.days": (horizon_end - now).days}) as freebusy_span:
+        busy_index = fetch_busy_index(service, now, horizon_end)
+        freebusy_span.set_attribute("busy.intervals", len(busy_index))
+    with span("calendar.existing_blocks") as existing_span:
+        # Earlier runs may have placed blocks any time before a due date that is still ahead
+        existing = fetch_existing_blocks(service, now - datetime.timedelta(days=horizon_days), horizon_end)
+        existing_span.set_attribute("block.count", sum(len(days) for days in existing.values()))
+    with span("planner.plan", **{"assignment.count": len(due_dates)}) as plan_span:
+        planned, shortfalls = plan_study_blocks(
+            pending_assignments, busy_index, now,
+            block_minutes=block_minutes, blocks_per_assignment=blocks_per_assignment,
+            horizon_end=horizon_end, existing_blocks=existing,
+        )
+        plan_span.set_attributes(**{"block.count": len(planned), "shortfall.count": len(shortfalls)})
+    with span("calendar.batch_insert", **{"block.count": len(planned)}) as write_span:
+        failed = write_study_blocks(service, planned) if planned else 0
+        write_span.set_attribute("failed.count", failed)
+
+    summary = f"Planned {len(planned) - failed} study block(s) of {block_minutes} minutes."
+    already = sum(len(days) for days in existing.values())
+    if already:
+        summary += f" {already} block(s) from earlier plans were kept."
+    if failed:
+        summary += f" {failed} block(s) failed to save."
+    if shortfalls:
+        short_titles = ", ".join(f"'{s['title']}'" for s in shortfalls[:5])
+        summary += f" Not enough free time before the due date for: {short_titles}"
+        if len(shortfalls) > 5:
+            summary += f" and {len(shortfalls) - 5} more"
+        summary += "."
+    logger.info(summary)
+    return summary
@@ -0,0 +1,741 @@
+# loadtest.py
+"""
+Load test for one Streamlit + Django deployment, runnable offline.
+
+Simulated students run the app's refresh and chat paths concurrently, through
+the same functions main.py calls: the account snapshot (Classroom API, or the
+push-fed store once the student's courses are registered), then summary,
+pending data and search index, then chat turns through the agent job server
+and the conversation store. They also hit the Django endpoints (Classroom
+push ingest, agent job status and metrics) through Django's test client.
+Google APIs are replaced by an in-process fake with configurable latency and
+per-user call counting. The LLM is replaced by a stub executor with
+configurable latency. Django runs against a throwaway test database, never
+db.sqlite3.
+
+    cd Langchain
+    python loadtest.py --students 50 --chat-turns 3 --llm-latency-ms 800 --output results.json
+    python loadtest.py --students 50 --baseline results.json   # compare with an earlier run
+
+Streamlit's AppTest cannot run sessions concurrently, so main.py itself is only
+driven for a single student (--ui-check) to check it still works with the fakes.
+"""
+import argparse
+import datetime
+import gc
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+os.environ.setdefault("GOOGLE_API_KEY", "loadtest-unused") # The stub executor never calls Gemini
+
+from utils.django_bridge import setup_django
+
+setup_django()
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+import dashboard.store
+from dashboard.conversations import PAGE_SIZE as CHAT_PAGE_SIZE
+from dashboard.models import ClassroomRegistration
+from dashboard.push import build_push_envelope
+
+from agents import gemini_agent
+from agents.job_server import get_job_server, serve_http, SUCCEEDED
+from google_api.classroom import process_snapshot
+from google_api.planner import plan_and_schedule_study_blocks
+from utils.retrieval import AssignmentIndex, format_results
+
+RESULTS_FORMAT_VERSION = 2 # 2: ui.* operations reported separately under "ui_check"
+PUSH_TOKEN = "loadtest"
+QUERIES = [
+    "What is due next?",
+    "Do I have any essays left?",
+    "Which lab reports are still pending?",
+    "What is due this week in my math course?",
+    "Show me assignments about trees and graphs",
+]
+TOPICS = [
+    "linked lists", "binary trees", "graph search", "essay on climate", "lab report titration",
+    "calculus limits", "matrix algebra", "poetry analysis", "history of printing", "sorting algorithms",
+]
+
+
+# --- Fake Google APIs -------------------------------------------------------------------------
+
+class _FakeRequest:
+    def __init__(self, api, user_key, method, result):
+        self.api = api
+        self.user_key = user_key
+        self.method = method
+        self.result = result
+
+    def execute(self, **kwargs):
+        return self.api.call(self.user_key, self.method, self.result)
+
+
+class FakeGoogleAPI:
+    """
+    In-process stand-in for the Classroom and Calendar APIs. Every execute()
+    sleeps `latency_seconds` and is counted per user and method. Course data is
+    deterministic: students share a pool of courses, as classmates do.
+    """
+
+    def __init__(self, latency_seconds=0.03, course_pool=20, courses_per_student=4,
+                 coursework_per_course=8, seed=0):
+        self.latency_seconds = latency_seconds
+        self.course_pool = course_pool
+        self.courses_per_student = min(courses_per_student, course_pool)
+        self.coursework_per_course = coursework_per_course
+        self.seed = seed
+        self.calls = defaultdict(Counter) # user key -> method -> count
+        self.events = defaultdict(list) # user key -> inserted calendar events
+        self._lock = threading.Lock()
+        self._today = datetime.date.today()
+
+    def call(self, user_key, method, result):
+        time.sleep(self.latency_seconds)
+        with self._lock:
+            self.calls[user_key][method] += 1
+        return result()
+
+    def insert_event(self, user_key, body):
+        event = {"id": uuid.uuid4().hex, **body}
+        with self._lock:
+            self.events[user_key].append(event)
+        return event
+
+    def list_events(self, user_key, private_property=None):
+        name, _, value = (private_property or "").partition("=")
+        with self._lock:
+            events = list(self.events[user_key])
+        if name:
+            events = [e for e in events if e.get("extendedProperties", {}).get("private", {}).get(name) == value]
+        return {"items": events}
+
+    def _rng(self, *parts):
+        digest = hashlib.sha256("/".join(map(str, (self.seed,) + parts)).encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def courses_for(self, user_key):
+        ids = self._rng("enrolment", user_key).sample(range(self.course_pool), self.courses_per_student)
+        return [{"id": f"course-{i}", "name": f"Course {i}", "section": "", "description": ""} for i in sorted(ids)]
+
+    def coursework_for(self, course_id):
+        rng = self._rng("coursework", course_id)
+        items = []
+        for j in range(self.coursework_per_course):
+            topic = rng.choice(TOPICS)
+            work = {
+                "id": f"{course_id}-work-{j}",
+                "title": f"{topic.title()} {j + 1}",
+                "description": f"Assignment on {topic}. Read the notes on {rng.choice(TOPICS)} first.",
+                "updateTime": "2026-01-01T00:00:00Z",
+            }
+            if j % 7 != 6: # Some coursework has no due date
+                due = self._today + datetime.timedelta(days=rng.randint(-10, 60))
+                work["dueDate"] = {"year": due.year, "month": due.month, "day": due.day}
+                work["dueTime"] = {"hours": rng.choice([9, 12, 17, 23]), "minutes": rng.choice([0, 30, 59])}
+            items.append(work)
+        return items
+
+    def submission_state(self, user_key, coursework_id):
+        return self._rng("state", user_key, coursework_id).choice(["CREATED", "CREATED", "TURNED_IN", "RETURNED", None])
+
+    def classroom(self, user_key):
+        return FakeClassroomService(self, user_key)
+
+    def calendar(self, user_key):
+        return FakeCalendarService(self, user_key)
+
+    def calls_by_user(self, user_keys):
+        with self._lock:
+            return {key: sum(self.calls[key].values()) for key in user_keys}
+
+    def calls_by_method(self, user_keys):
+        total = Counter()
+        with self._lock:
+            for key in user_keys:
+                total.update(self.calls[key])
+        return dict(total)
+
+
+def _not_found():
+    return HttpError(httplib2.Response({"status": "404"}), b'{"error": {"code": 404}}')
+
+
+class _FakeSubmissions:
+    def __init__(self, api, user_key):
+        self.api = api
+        self.user_key = user_key
+
+    def list(self, courseId, courseWorkId, userId="me", **kwargs):
+        def result():
+            state = self.api.submission_state(self.user_key, courseWorkId)
+            return {"studentSubmissions": [{"state": state}] if state else []}
+        return _FakeRequest(self.api, self.user_key, "courseWork.studentSubmissions.list", result)
+
+
+class _FakeCourseWork:
+    def __init__(self, api, user_key):
+        self.api = api
+        self.user_key = user_key
+
+    def list(self, courseId, **kwargs):
+        return _FakeRequest(self.api, self.user_key, "courseWork.list",
+                            lambda: {"courseWork": self.api.coursework_for(courseId)})
+
+    def get(self, courseId, id):
+        def result():
+            for work in self.api.coursework_for(courseId):
+                if work["id"] == id:
+                    return work
+            raise _not_found()
+        return _FakeRequest(self.api, self.user_key, "courseWork.get", result)
+
+    def studentSubmissions(self):
+        return _FakeSubmissions(self.api, self.user_key)
+
+
+class _FakeCourses:
+    def __init__(self, api, user_key):
+        self.api = api
+        self.user_key = user_key
+
+    def list(self, **kwargs):
+        return _FakeRequest(self.api, self.user_key, "courses.list",
+                            lambda: {"courses": self.api.courses_for(self.user_key)})
+
+    def get(self, id):
+        def result():
+            for course in self.api.courses_for(self.user_key):
+                if course["id"] == id:
+                    return course
+            raise _not_found()
+        return _FakeRequest(self.api, self.user_key, "courses.get", result)
+
+    def courseWork(self):
+        return _FakeCourseWork(self.api, self.user_key)
+
+
+class FakeClassroomService:
+    def __init__(self, api, user_key):
+        self.api = api
+        self.user_key = user_key
+
+    def courses(self):
+        return _FakeCourses(self.api, self.user_key)
+
+
+class _FakeBatch:
+    def __init__(self, api, user_key, callback):
+        self.api = api
+        self.user_key = user_key
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request):
+        self.requests.append(request)
+
+    def execute(self):
+        # One HTTP round trip for the whole batch, like the real batch endpoint
+        self.api.call(self.user_key, "batch", lambda: None)
+        for i, request in enumerate(self.requests):
+            response = request.result()
+            if self.callback:
+                self.callback(str(i), response, None)
+
+
+class _FakeCalendarResource:
+    def __init__(self, api, user_key):
+        self.api = api
+        self.user_key = user_key
+
+    # calendars()
+    def get(self, calendarId):
+        return _FakeRequest(self.api, self.user_key, "calendars.get", lambda: {"id": self.user_key})
+
+    # events()
+    def insert(self, calendarId, body):
+        return _FakeRequest(self.api, self.user_key, "events.insert",
+                            lambda: self.api.insert_event(self.user_key, body))
+
+    def list(self, calendarId, privateExtendedProperty=None, **kwargs):
+        return _FakeRequest(self.api, self.user_key, "events.list",
+                            lambda: self.api.list_events(self.user_key, privateExtendedProperty))
+
+    # freebusy()
+    def query(self, body):
+        return _FakeRequest(self.api, self.user_key, "freebusy.query",
+                            lambda: {"calendars": {item["id"]: {"busy": []} for item in body["items"]}})
+
+
+class FakeCalendarService:
+    def __init__(self, api, user_key):
+        self.api = api
+        self.user_key = user_key
+
+    def calendars(self):
+        return _FakeCalendarResource(self.api, self.user_key)
+
+    def events(self):
+        return _FakeCalendarResource(self.api, self.user_key)
+
+    def freebusy(self):
+        return _FakeCalendarResource(self.api, self.user_key)
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(self.api, self.user_key, callback)
+
+
+class FakeCredentials:
+    def __init__(self, user_key):
+        self.user_key = user_key
+
+
+# --- Stub LLM ---------------------------------------------------------------------------------
+
+class StubAgentExecutor:
+    """
+    Stands in for the Gemini AgentExecutor: answers from the session's search index
+    (like the search_assignments tool), sleeps for the configured LLM latency and,
+    every `plan_every` turns, runs the study planner against the fake calendar.
+    """
+    turns = Counter()
+    _lock = threading.Lock()
+
+    def __init__(self, session, latency_seconds, plan_every=0):
+        self.session = session
+        self.latency_seconds = latency_seconds
+        self.plan_every = plan_every
+
+    def invoke(self, payload, config=None):
+        with self._lock:
+            StubAgentExecutor.turns[self.session.session_id] += 1
+            turn = StubAgentExecutor.turns[self.session.session_id]
+        output = format_results(self.session.retrieval_index.search(payload["input"], k=5))
+        if self.plan_every and turn % self.plan_every == 0:
+            output = plan_and_schedule_study_blocks(self.session.pending_assignments, self.session.calendar_service)
+        time.sleep(self.latency_seconds)
+        return {"output": output, "intermediate_steps": []}
+
+
+# --- Simulated students -----------------------------------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list) # operation -> [seconds]
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def timed(self, operation, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.errors[operation] += 1
+            print(f"{operation} failed: {type(e).__name__}: {e}", file=sys.stderr)
+            return None
+        with self._lock:
+            self.samples[operation].append(time.perf_counter() - start)
+        return result
+
+    def fail(self, operation):
+        with self._lock:
+            self.errors[operation] += 1
+
+
+class SimulatedStudent:
+    """One browser session: the refresh/chat steps of main.py plus the Django calls around them."""
+
+    def __init__(self, number, api, conversation_store, recorder, options):
+        self.user_key = f"student{number}@loadtest.local"
+        self.session_id = uuid.uuid4().hex
+        self.api = api
+        self.conversation_store = conversation_store
+        self.recorder = recorder
+        self.options = options
+        self.rng = random.Random(number)
+        self.gcr_service = None
+        self.calendar_service = None
+        self.assignment_index = AssignmentIndex()
+        self.pending_assignments = {}
+        self.summary = ""
+        self.chat_messages = []
+        self.chat_user_key = None
+        self.user = get_user_model().objects.create_user(username=f"student{number}", email=self.user_key)
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.registrations = {}
+
+    # main.py: login button -> get_service, agent session, chat history, fetch_and_store_assignments
+    def login(self):
+        self.gcr_service = self.api.classroom(self.user_key)
+        self.calendar_service = self.api.calendar(self.user_key)
+        gemini_agent.session_pool.get(self.session_id, calendar_service=self.calendar_service)
+        self.chat_user_key = self.calendar_service.calendars().get(calendarId="primary").execute()["id"]
+        self.chat_messages, _ = self.conversation_store.load_page(self.chat_user_key, limit=CHAT_PAGE_SIZE)
+        self.refresh()
+
+    # main.py: fetch_and_store_assignments
+    def refresh(self):
+        snapshot = dashboard.store.load_account_snapshot(self.chat_user_key, self.gcr_service)
+        self.summary, pending, _ = process_snapshot(snapshot, self.assignment_index)
+        self.pending_assignments = pending or {}
+        agent_session = gemini_agent.session_pool.get(self.session_id)
+        agent_session.pending_assignments = self.pending_assignments
+        agent_session.retrieval_index = self.assignment_index
+        for course in snapshot["courses"]:
+            self.registrations.setdefault(course["id"], f"reg-{self.session_id}-{course['id']}")
+
+    # main.py: chat_input -> submit_agent_turn, then pending_job_panel polling until the job finishes
+    def chat_turn(self, query):
+        agent_session = gemini_agent.session_pool.get(self.session_id, calendar_service=self.calendar_service)
+        agent_session.pending_assignments = self.pending_assignments
+        agent_session.retrieval_index = self.assignment_index
+        job_server = get_job_server()
+        job_id = job_server.submit(
+            gemini_agent.invoke_agent,
+            agent_session,
+            gemini_agent.build_agent_payload(query, self.chat_messages, self.assignment_index),
+            owner=self.chat_user_key,
+        )
+        self._record_message("human", query)
+        job = job_server.wait(job_id, timeout=self.options.job_timeout)
+        if job is None or job.status != SUCCEEDED:
+            raise RuntimeError(f"agent job {job_id} ended as {job.status if job else 'unknown'}")
+        self._record_message("ai", job.result["output"])
+        return job_id
+
+    def _record_message(self, role, content):
+        self.chat_messages.append(self.conversation_store.append(self.chat_user_key, role, content, self.session_id))
+        del self.chat_messages[:-CHAT_PAGE_SIZE]
+
+    # manage.py register_classroom_push: register every course and seed it into the store
+    def register_push(self):
+        for course_id, registration_id in sorted(self.registrations.items()):
+            _, created = ClassroomRegistration.objects.get_or_create(
+                registration_id=registration_id, defaults={"user": self.user, "course_id": course_id}
+            )
+            if created:
+                dashboard.store.refresh_course(self.user, course_id, service=self.gcr_service)
+
+    def push_notification(self):
+        course_id = self.rng.choice(sorted(self.registrations))
+        registration_id = self.registrations[course_id]
+        coursework_id = self.rng.choice(self.api.coursework_for(course_id))["id"]
+        response = Client().post(
+            f"/classroom/push/?token={PUSH_TOKEN}",
+            data=build_push_envelope(registration_id, course_id, coursework_id),
+            content_type="application/json",
+        )
+        if response.status_code != 204:
+            raise RuntimeError(f"push endpoint returned HTTP {response.status_code}")
+
+    def job_status(self, job_id):
+        response = self.client.get(f"/agent/jobs/{job_id}/")
+        if response.status_code != 200:
+            raise RuntimeError(f"job status endpoint returned HTTP {response.status_code}")
+
+    def job_metrics(self):
+        response = self.client.get("/agent/jobs/metrics/")
+        if response.status_code != 200:
+            raise RuntimeError(f"job metrics endpoint returned HTTP {response.status_code}")
+
+    def think(self):
+        if self.options.think_ms:
+            time.sleep(self.rng.uniform(0, self.options.think_ms) / 1000)
+
+    def run_session(self):
+        timed = self.recorder.timed
+        if self.options.pushes_per_turn:
+            # From here on refreshes read the push-fed store, as main.py does for registered accounts
+            timed("push.register", self.register_push)
+        for turn in range(self.options.chat_turns):
+            self.think()
+            # A full job queue (JobQueueFull) counts as a chat_turn error, as the UI would show "busy"
+            job_id = timed("chat_turn", self.chat_turn, self.rng.choice(QUERIES))
+            if job_id:
+                timed("django.job_status", self.job_status, job_id)
+            for _ in range(self.options.pushes_per_turn):
+                timed("django.push", self.push_notification)
+        for _ in range(self.options.refreshes):
+            self.think()
+            timed("refresh", self.refresh)
+        timed("django.job_metrics", self.job_metrics)
+
+
+# --- Measurement and reporting ----------------------------------------------------------------
+
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # Peak, not current, off Linux
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize_operations(recorder, wall_seconds):
+    operations = {}
+    for operation in sorted(set(recorder.samples) | set(recorder.errors)):
+        values = sorted(recorder.samples.get(operation, []))
+        operations[operation] = {
+            "count": len(values),
+            "errors": recorder.errors.get(operation, 0),
+            "throughput_per_s": round(len(values) / wall_seconds, 2) if wall_seconds else 0.0,
+            "mean_ms": round(1000 * sum(values) / len(values), 1) if values else 0.0,
+            "p50_ms": round(1000 * percentile(values, 50), 1),
+            "p95_ms": round(1000 * percentile(values, 95), 1),
+            "p99_ms": round(1000 * percentile(values, 99), 1),
+            "max_ms": round(1000 * values[-1], 1) if values else 0.0,
+        }
+    return operations
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _print_operations(operations):
+    print(f"{'operation':<22} {'count':>6} {'err':>4} {'ops/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, op in operations.items():
+        print(f"{name:<22} {op['count']:>6} {op['errors']:>4} {op['throughput_per_s']:>8} "
+              f"{op['p50_ms']:>9} {op['p95_ms']:>9} {op['p99_ms']:>9} {op['max_ms']:>9}")
+
+
+def print_report(results):
+    print(f"\n{results['config']['students']} students, {results['wall_seconds']} s wall time")
+    _print_operations(results["operations"])
+    if results.get("ui_check"):
+        print(f"\nUI check (single AppTest session, {results['ui_check']['wall_seconds']} s wall time)")
+        _print_operations(results["ui_check"]["operations"])
+    memory = results["memory"]
+    google = results["google_calls"]
+    print(f"memory: {memory['per_session_kb']} KB per session (RSS {memory['rss_before_mb']} -> {memory['rss_after_login_mb']} MB)")
+    print(f"google calls per student: mean {google['per_user_mean']}, max {google['per_user_max']}")
+
+
+def compare_with_baseline(results, baseline):
+    """Prints latency, memory and Google-call changes against an earlier results file."""
+    print(f"\nChange vs baseline ({baseline.get('git_commit') or 'unknown commit'}, {baseline.get('started_at')}):")
+    ignored = {"output", "baseline", "ui_check"}
+    differing = sorted(key for key, value in results["config"].items()
+                       if key not in ignored and baseline.get("config", {}).get(key) != value)
+    if differing:
+        print(f"Warning: runs used different settings ({', '.join(differing)}); numbers are not directly comparable.")
+    old_operations = dict(baseline.get("operations", {}))
+    old_operations.update((baseline.get("ui_check") or {}).get("operations", {}))
+    operations = dict(results["operations"])
+    operations.update((results.get("ui_check") or {}).get("operations", {}))
+    for name, op in operations.items():
+        old = old_operations.get(name)
+        if not old:
+            print(f"{name:<22} (new)")
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s"):
+            change = f"{(op[key] - old[key]) / old[key] * 100:+.0f}%" if old[key] else "n/a"
+            parts.append(f"{key} {old[key]} -> {op[key]} ({change})")
+        print(f"{name:<22} " + ", ".join(parts))
+    for section, key in (("memory", "per_session_kb"), ("google_calls", "per_user_mean")):
+        old = baseline.get(section, {}).get(key)
+        if old is not None:
+            print(f"{section}.{key}: {old} -> {results[section][key]}")
+
+
+def run_ui_check(api, recorder):
+    """Drives main.py once through Streamlit's AppTest, with the same fakes."""
+    from streamlit.testing.v1 import AppTest
+    import utils.google_services
+
+    original_get_service = utils.google_services.get_service
+    utils.google_services.get_service = lambda creds: (api.classroom(creds.user_key), api.calendar(creds.user_key))
+    try:
+        app = AppTest.from_file(str(Path(__file__).resolve().with_name("main.py")), default_timeout=120)
+        app.session_state["creds"] = FakeCredentials("ui-student@loadtest.local")
+        recorder.timed("ui.load", app.run)
+        if app.exception:
+            recorder.fail("ui.load")
+            return
+        start = time.perf_counter()
+        app.chat_input[0].set_value(QUERIES[0]).run()
+        while app.session_state.pending_agent_job_id and time.perf_counter() - start < 120:
+            app.run()
+        if app.exception or app.session_state.pending_agent_job_id:
+            recorder.fail("ui.chat_turn")
+        else:
+            recorder.samples["ui.chat_turn"].append(time.perf_counter() - start)
+    finally:
+        utils.google_services.get_service = original_get_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Classroom assistant with simulated students.")
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--chat-turns", type=int, default=3, help="Chat turns per student.")
+    parser.add_argument("--refreshes", type=int, default=1, help="Extra assignment refreshes per student.")
+    parser.add_argument("--pushes-per-turn", type=int, default=1, help="Classroom push notifications per chat turn.")
+    parser.add_argument("--google-latency-ms", type=float, default=30)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--plan-every", type=int, default=0,
+                        help="Run the study planner on every Nth chat turn of a student (0: never).")
+    parser.add_argument("--courses", type=int, default=4, help="Courses per student.")
+    parser.add_argument("--coursework", type=int, default=8, help="Coursework items per course.")
+    parser.add_argument("--think-ms", type=float, default=500, help="Max random pause between a student's actions.")
+    parser.add_argument("--ramp-seconds", type=float, default=2, help="Spread student logins over this long.")
+    parser.add_argument("--job-timeout", type=float, default=120, help="Seconds to wait for one agent job.")
+    parser.add_argument("--push-debounce", type=float, default=0.5, help="CLASSROOM_PUSH_DEBOUNCE_SECONDS for the run.")
+    parser.add_argument("--ui-check", action="store_true", help="Also drive main.py once through AppTest.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON here.")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against.")
+    options = parser.parse_args()
+    if options.students < 1:
+        parser.error("--students must be at least 1")
+
+    # Throwaway database; a file rather than shared in-memory SQLite so concurrent writers wait instead of failing
+    test_db_dir = tempfile.mkdtemp(prefix="loadtest-")
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(test_db_dir, "loadtest.sqlite3")
+    setup_test_environment()
+    old_db_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+
+    settings.CLASSROOM_PUSH_TOKEN = PUSH_TOKEN
+    settings.CLASSROOM_PUSH_DEBOUNCE_SECONDS = options.push_debounce
+    api = FakeGoogleAPI(
+        latency_seconds=options.google_latency_ms / 1000,
+        course_pool=max(options.courses, options.students // 5),
+        courses_per_student=options.courses,
+        coursework_per_course=options.coursework,
+        seed=options.seed,
+    )
+    from dashboard.conversations import get_conversation_store
+    from dashboard.push import get_coalescer
+    dashboard.store.get_user_classroom_service = lambda user: api.classroom(user.email)
+    gemini_agent.session_pool.executor_factory = lambda session: StubAgentExecutor(
+        session, options.llm_latency_ms / 1000, options.plan_every
+    )
+    job_server = get_job_server()
+    httpd = serve_http(job_server, "127.0.0.1", 0)
+    settings.AGENT_JOB_SERVER_URL = f"http://127.0.0.1:{httpd.server_address[1]}"
+    conversation_store = get_conversation_store()
+
+    recorder = Recorder()
+    try:
+        students = [SimulatedStudent(n, api, conversation_store, recorder, options) for n in range(options.students)]
+        gc.collect()
+        rss_before = rss_bytes()
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        wall_start = time.perf_counter()
+
+        def login(student, delay):
+            time.sleep(delay)
+            recorder.timed("login", student.login)
+
+        with ThreadPoolExecutor(max_workers=options.students) as pool:
+            step = options.ramp_seconds / options.students
+            list(pool.map(login, students, [i * step for i in range(options.students)]))
+        gc.collect()
+        rss_after_login = rss_bytes()
+
+        with ThreadPoolExecutor(max_workers=options.students) as pool:
+            list(pool.map(lambda student: student.run_session(), students))
+        recorder.timed("push.flush", get_coalescer().flush)
+        wall_seconds = time.perf_counter() - wall_start
+
+        ui_check = None
+        if options.ui_check:
+            # Runs after the concurrent phase, so it gets its own recorder and wall time
+            ui_recorder = Recorder()
+            ui_start = time.perf_counter()
+            run_ui_check(api, ui_recorder)
+            ui_seconds = time.perf_counter() - ui_start
+            ui_check = {
+                "wall_seconds": round(ui_seconds, 2),
+                "operations": summarize_operations(ui_recorder, ui_seconds),
+            }
+
+        user_keys = [student.user_key for student in students]
+        calls_per_user = sorted(api.calls_by_user(user_keys).values())
+        results = {
+            "format_version": RESULTS_FORMAT_VERSION,
+            "started_at": started_at.isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "config": vars(options),
+            "wall_seconds": round(wall_seconds, 2),
+            "operations": summarize_operations(recorder, wall_seconds),
+            "ui_check": ui_check,
+            "memory": {
+                "rss_before_mb": round(rss_before / 2**20, 1),
+                "rss_after_login_mb": round(rss_after_login / 2**20, 1),
+                "per_session_kb": round((rss_after_login - rss_before) / options.students / 1024, 1),
+            },
+            "google_calls": {
+                "total": sum(calls_per_user),
+                "per_user_mean": round(sum(calls_per_user) / len(calls_per_user), 1),
+                "per_user_p50": calls_per_user[len(calls_per_user) // 2],
+                "per_user_max": calls_per_user[-1],
+                "by_method": api.calls_by_method(user_keys),
+            },
+            "llm_calls": sum(StubAgentExecutor.turns.values()),
+            "agent_sessions": len(gemini_agent.session_pool),
+            "job_server": job_server.metrics(),
+        }
+
+        print_report(results)
+        if options.baseline:
+            with open(options.baseline) as f:
+                compare_with_baseline(results, json.load(f))
+        if options.output:
+            with open(options.output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"\nResults written to {options.output}")
+    finally:
+        httpd.shutdown()
+        # Write everything still buffered now: once the test database is gone, the settings
+        # point at the real database again
+        get_coalescer().flush()
+        conversation_store.flush()
+        connection.creation.destroy_test_db(old_db_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,25 @@
 import streamlit as st
 from auth.google_auth import get_credentials
 from agents import gemini_agent # Agent module
-from google_api.classroom import get_coursework_with_submissions, get_pending_assignments_for_calendar
+from agents.job_server import get_job_server, JobQueueFull, SUCCEEDED, FAILED, CANCELLED
+from google_api.classroom import process_snapshot
 from utils.google_services import get_service
-from langchain_core.messages import HumanMessage, AIMessage
+from utils.retrieval import AssignmentIndex
+from utils.django_bridge import setup_django
+from utils.tracing import span
 import logging
-import json # For pretty printing dictionaries/lists
-import datetime # To get the current date
+import uuid
+
+setup_django() # Chat history is stored in the Django project's database
+from dashboard.conversations import get_conversation_store, PAGE_SIZE as CHAT_PAGE_SIZE
+from dashboard.store import load_account_snapshot
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+AGENT_JOB_POLL_SECONDS = 0.5
+
 st.set_page_config(page_title="📘 Google Classroom Assistant", layout="wide")
 st.title("📘 Google Classroom Assignment Assistant")
 
@@ -29,6 +37,21 @@ if "gcr_service" not in st.session_state:
     st.session_state.gcr_service = None
 if "calendar_service_main" not in st.session_state:
     st.session_state.calendar_service_main = None
+if "assignment_index" not in st.session_state:
+    # Incrementally updated TF-IDF index the agent's search_assignments tool queries
+    st.session_state.assignment_index = AssignmentIndex()
+if "chat_visible_count" not in st.session_state:
+    # Upper bound on chat messages kept in session memory; older ones are re-read from the store
+    st.session_state.chat_visible_count = CHAT_PAGE_SIZE
+if "chat_user_key" not in st.session_state:
+    st.session_state.chat_user_key = None
+if "chat_has_older" not in st.session_state:
+    st.session_state.chat_has_older = False
+if "pending_agent_job_id" not in st.session_state:
+    st.session_state.pending_agent_job_id = None
+if "agent_session_id" not in st.session_state:
+    # Keys this browser session's executor and tool bindings in the shared agent pool
+    st.session_state.agent_session_id = uuid.uuid4().hex
 
 
 def fetch_and_store_assignments():
@@ -36,11 +59,18 @@ def fetch_and_store_assignments():
         logger.info("MAIN: Attempting to fetch assignments...")
         with st.spinner("🔄 Fetching your Google Classroom assignments..."):
             try:
-                summary_str = get_coursework_with_submissions(st.session_state.gcr_service)
-                st.session_state.assignment_summary_context = summary_str if summary_str else "No assignment summary found or an error occurred."
-                
-                structured_data = get_pending_assignments_for_calendar(st.session_state.gcr_service)
-                st.session_state.structured_assignments_for_calendar = structured_data if structured_data else {}
+                with span("refresh", **{"session.id": st.session_state.agent_session_id}):
+                    # One snapshot (push-fed store or Classroom API); summary, calendar data and search index all derive from it
+                    snapshot = load_account_snapshot(st.session_state.chat_user_key, st.session_state.gcr_service)
+                    summary_str, structured_data, changed = process_snapshot(snapshot, st.session_state.assignment_index)
+                    st.session_state.assignment_summary_context = summary_str if summary_str else "No assignment summary found or an error occurred."
+                    st.session_state.structured_assignments_for_calendar = structured_data if structured_data else {}
+                logger.info(f"MAIN: Assignment index updated ({changed} changed, {len(st.session_state.assignment_index)} total).")
+
+                # Agent tools read pending assignments and the index off the agent session
+                agent_session = gemini_agent.session_pool.get(st.session_state.agent_session_id)
+                agent_session.pending_assignments = st.session_state.structured_assignments_for_calendar
+                agent_session.retrieval_index = st.session_state.assignment_index
 
                 if summary_str or structured_data: # Check if either has data
                     st.success("✅ Assignments fetched and updated!")
@@ -58,6 +88,65 @@ def fetch_and_store_assignments():
         logger.warning("MAIN: Attempted to fetch assignments without credentials or gcr_service.")
         st.warning("Could not fetch assignments: Login or service issue.")
 
+def resolve_chat_user_key(calendar_service):
+    """Stable per-account key for stored chat history: the primary calendar's id is the account email."""
+    try:
+        return calendar_service.calendars().get(calendarId="primary").execute()["id"]
+    except Exception as e:
+        logger.warning(f"MAIN: Could not identify the Google account; chat history will not be saved. {e}")
+        return None
+
+
+def load_chat_history():
+    st.session_state.chat_user_key = resolve_chat_user_key(st.session_state.calendar_service_main)
+    if st.session_state.chat_user_key:
+        try:
+            messages, has_older = get_conversation_store().load_page(st.session_state.chat_user_key, limit=CHAT_PAGE_SIZE)
+        except Exception as e:
+            # A store outage must not fail the login; chat works in memory only, like an unidentified account
+            logger.warning(f"MAIN: Could not load chat history; chat history will not be saved. {e}")
+            st.session_state.chat_user_key = None
+            return
+        st.session_state.chat_messages = messages
+        st.session_state.chat_has_older = has_older
+        st.session_state.chat_visible_count = CHAT_PAGE_SIZE
+
+
+def record_chat_message(role, content):
+    """Appends a chat message to the session window and (write-behind) to the conversation store."""
+    messages = st.session_state.chat_messages
+    if not st.session_state.chat_user_key:
+        messages.append({"type": role, "content": content})
+        return
+    messages.append(get_conversation_store().append(
+        st.session_state.chat_user_key, role, content, session_id=st.session_state.agent_session_id
+    ))
+    # Keep only the visible window in memory; older turns are paged back in from the store on demand
+    overflow = len(messages) - st.session_state.chat_visible_count
+    if overflow > 0:
+        del messages[:overflow]
+        st.session_state.chat_has_older = True
+
+
+def show_older_messages():
+    messages = st.session_state.chat_messages
+    if len(messages) > st.session_state.chat_visible_count:
+        # Not persisted (no account key): everything is in memory, just widen the window
+        st.session_state.chat_visible_count += CHAT_PAGE_SIZE
+        return
+    store = get_conversation_store()
+    if messages[0]["id"] is None:
+        store.flush() # Still buffered; writing it fills in the id the page cursor needs
+    older, has_older = store.load_page(
+        st.session_state.chat_user_key, before=(messages[0]["created_at"], messages[0]["id"]), limit=CHAT_PAGE_SIZE
+    )
+    # If the flush failed the cursor has no id and the page overlaps turns already shown
+    held_ids = {message["id"] for message in messages if message["id"] is not None}
+    older = [message for message in older if message["id"] not in held_ids]
+    messages[:0] = older
+    st.session_state.chat_visible_count += len(older)
+    st.session_state.chat_has_older = has_older
+
 # Authentication
 if st.session_state.creds is None:
     st.info("Please log in with Google to access Classroom and Calendar features.")
@@ -71,7 +160,8 @@ if st.session_state.creds is None:
                 st.session_state.gcr_service = gcr_s
                 st.session_state.calendar_service_main = cal_s # Used by main if needed
                 
-                gemini_agent.set_services(gcr_s, cal_s) # Pass to agent module
+                gemini_agent.session_pool.get(st.session_state.agent_session_id, calendar_service=cal_s)
+                load_chat_history()
 
                 st.success("✅ Login Successful! Initializing assignments...")
                 fetch_and_store_assignments() # Fetch assignments immediately
@@ -88,14 +178,19 @@ else:
         gcr_s, cal_s = get_service(st.session_state.creds)
         st.session_state.gcr_service = gcr_s
         st.session_state.calendar_service_main = cal_s
-        gemini_agent.set_services(gcr_s, cal_s) # Re-pass to agent module
+        gemini_agent.session_pool.get(st.session_state.agent_session_id, calendar_service=cal_s)
+        if st.session_state.chat_user_key is None:
+            load_chat_history()
         # Fetch assignments if they haven't been fetched yet in this session
         if st.session_state.assignment_summary_context == "No assignments fetched yet. Please log in or refresh.":
             fetch_and_store_assignments()
 
 
 # UI Elements
-if st.session_state.creds:
+# Each panel is a fragment: interacting with one reruns only that panel,
+# not the whole script (login checks, the other panel, full chat history).
+@st.fragment
+def assignments_panel():
     if st.button("🔄 Refresh Assignments"):
         fetch_and_store_assignments()
 
@@ -106,77 +201,114 @@ if st.session_state.creds:
         else:
             st.markdown("No assignment summary available.")
 
-# Display chat history
-for message_data in st.session_state.chat_messages:
-    with st.chat_message(message_data["type"]):
-        st.markdown(message_data["content"])
-
-# Gemini Chat Input
-user_query = st.chat_input("Ask about your assignments or schedule...")
-
-if user_query and st.session_state.creds:
-    st.session_state.chat_messages.append({"type": "human", "content": user_query})
-    with st.chat_message("human"):
-        st.markdown(user_query)
-
-    # Prepare agent_lc_history
-    agent_lc_history = []
-    for msg_data in st.session_state.chat_messages[:-1]: 
-        if msg_data["type"] == "human":
-            agent_lc_history.append(HumanMessage(content=msg_data["content"]))
-        elif msg_data["type"] == "ai":
-            agent_lc_history.append(AIMessage(content=msg_data["content"]))
-
-    with st.chat_message("ai"):
-        with st.spinner("🤖 Gemini is thinking..."):
-            response_data = None # To store the full agent response for debugging
-            try:
-                # Re-ensure agent services are set, in case of module reload issues
-                if gemini_agent.calendar_service_agent is None and st.session_state.calendar_service_main:
-                    logger.warning("MAIN: Re-setting agent services before invoke call.")
-                    gemini_agent.set_services(st.session_state.gcr_service, st.session_state.calendar_service_main)
 
-                assignment_context_payload = st.session_state.assignment_summary_context if st.session_state.assignment_summary_context else "No assignment data available."
-                structured_payload = st.session_state.structured_assignments_for_calendar if st.session_state.structured_assignments_for_calendar else {}
-                
-                # Get the current date
-                current_date_str = datetime.date.today().strftime("%Y-%m-%d")
-
-                if not hasattr(gemini_agent, 'agent_executor'):
-                    raise AttributeError("CRITICAL: Agent executor not found in gemini_agent. Ensure it's initialized at module load.")
-
-                # --- This is the invoke call for Option A ---
-                response_data = gemini_agent.agent_executor.invoke(
-                    {
-                        "input": user_query, # User's direct query
-                        "chat_history": agent_lc_history,
-                        "assignment_context": assignment_context_payload,
-                        "structured_assignments_for_calendar": structured_payload,
-                        "Current Date": current_date_str # Passed as a separate key
-                    }
-                )
-                # --- End of invoke call specific to Option A ---
-
-                ai_response_content = response_data.get('output', "Sorry, I couldn't get a clear response.")
-                st.markdown(ai_response_content)
-                st.session_state.chat_messages.append({"type": "ai", "content": ai_response_content})
+def render_agent_job_result(job):
+    """Shows a finished agent job's outcome and records it in the chat history."""
+    st.session_state.pending_agent_job_id = None
+    if job is None:
+        # Result expired or the server restarted; nothing left to show. Toasts outlive the rerun that follows.
+        st.toast("The previous request is no longer available. Please ask again.", icon="⚠️")
+    elif job.status == SUCCEEDED:
+        ai_response_content = job.result.get('output', "Sorry, I couldn't get a clear response.")
+        st.markdown(ai_response_content)
+        record_chat_message("ai", ai_response_content)
+    elif job.status == CANCELLED:
+        st.toast("Request cancelled.")
+    else:
+        error_message = f"Agent Error: {job.error}"
+        st.error(error_message) # Show the primary error message in Streamlit
+        logger.error(f"MAIN: Agent Error in job {job.job_id}: {job.error}")
+        record_chat_message("ai", error_message)
 
-            except Exception as e:
-                error_message = f"Agent Error: {e}"
-                st.error(error_message) # Show the primary error message in Streamlit
-                logger.error(f"MAIN: Agent Error: {e}", exc_info=True) # Log full traceback to console
-                st.session_state.chat_messages.append({"type": "ai", "content": error_message})
-                
-                if response_data and 'intermediate_steps' in response_data:
-                    st.error("Intermediate Agent Steps (for debugging):")
-                    try:
-                        st.json(response_data['intermediate_steps'])
-                        logger.info(f"MAIN DEBUG: Intermediate steps on error: {json.dumps(response_data['intermediate_steps'], indent=2)}")
-                    except Exception as json_e: # Fallback if intermediate_steps are not directly JSON serializable
-                        st.text(str(response_data['intermediate_steps']))
-                        logger.info(f"MAIN DEBUG: Intermediate steps (raw on error): {response_data['intermediate_steps']}")
-                else:
-                    st.warning("No intermediate steps data available in the response to display on error (or error occurred before response_data was set).")
 
-elif user_query and not st.session_state.creds:
-    st.warning("Please log in with Google first to use the assistant.")
\ No newline at end of file
+def submit_agent_turn(user_query):
+    # The job copies this context, so the worker's "agent.invoke" span nests under "chat.submit"
+    with span("chat.submit", **{"session.id": st.session_state.agent_session_id}) as submit_span:
+        # The pool may have evicted this session while it sat idle; get() rebuilds it on demand
+        agent_session = gemini_agent.session_pool.get(
+            st.session_state.agent_session_id,
+            calendar_service=st.session_state.calendar_service_main
+        )
+
+        structured_payload = st.session_state.structured_assignments_for_calendar if st.session_state.structured_assignments_for_calendar else {}
+        agent_session.pending_assignments = structured_payload
+        agent_session.retrieval_index = st.session_state.assignment_index
+
+        # Runs on the job server's worker pool; the result is picked up by pending_job_panel's polling
+        job_id = get_job_server().submit(
+            gemini_agent.invoke_agent,
+            agent_session,
+            gemini_agent.build_agent_payload(
+                user_query, st.session_state.chat_messages, st.session_state.assignment_index
+            ),
+            # The Google account email, so the Django job status API can check the job belongs to its user
+            owner=st.session_state.chat_user_key or st.session_state.agent_session_id,
+        )
+        submit_span.set_attribute("job.id", job_id)
+        return job_id
+
+
+@st.fragment(run_every=AGENT_JOB_POLL_SECONDS)
+def pending_job_panel():
+    """Checks the pending agent job on every tick; reruns the app once it has finished."""
+    job_server = get_job_server()
+    job = job_server.get(st.session_state.pending_agent_job_id)
+    if job is None or job.status in (SUCCEEDED, FAILED, CANCELLED):
+        render_agent_job_result(job)
+        # A full rerun redraws the chat history with the reply and re-enables the chat input
+        st.rerun()
+    st.markdown("🤖 Gemini is thinking...")
+    if st.button("Cancel request"):
+        job_server.cancel(job.job_id)
+
+
+def submit_chat_query():
+    """chat_input callback; runs before the chat panel redraws, so the new turn shows without a manual rerun."""
+    user_query = st.session_state.chat_query
+    if not user_query:
+        return
+    if not st.session_state.creds:
+        st.toast("Please log in with Google first to use the assistant.", icon="⚠️")
+        return
+    try:
+        st.session_state.pending_agent_job_id = submit_agent_turn(user_query)
+        record_chat_message("human", user_query)
+    except JobQueueFull as e:
+        st.toast(f"The assistant is busy right now. Please try again in a moment. ({e})", icon="⚠️")
+        logger.warning(f"MAIN: {e}")
+    except Exception as e:
+        record_chat_message("human", user_query)
+        logger.error(f"MAIN: Agent Error: {e}", exc_info=True) # Log full traceback to console
+        record_chat_message("ai", f"Agent Error: {e}")
+
+
+@st.fragment
+def chat_panel():
+    messages = st.session_state.chat_messages
+    hidden_count = max(0, len(messages) - st.session_state.chat_visible_count)
+    if hidden_count or st.session_state.chat_has_older:
+        st.button("⬆️ Show older messages", key="show_older_messages", on_click=show_older_messages)
+
+    # Display only the most recent page of chat history
+    for message_data in messages[hidden_count:]:
+        with st.chat_message(message_data["type"]):
+            st.markdown(message_data["content"])
+
+    # Pending agent job: polled by its own fragment so the rest of the UI is not blocked on the LLM call
+    if st.session_state.pending_agent_job_id:
+        with st.chat_message("ai"):
+            pending_job_panel()
+
+    # Gemini Chat Input
+    st.chat_input(
+        "Ask about your assignments or schedule...",
+        key="chat_query",
+        on_submit=submit_chat_query,
+        disabled=bool(st.session_state.pending_agent_job_id),
+    )
+
+
+if st.session_state.creds:
+    assignments_panel()
+
+chat_panel()
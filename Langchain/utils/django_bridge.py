@@ -0,0 +1,16 @@
+# utils/django_bridge.py
+import os
+import sys
+from pathlib import Path
+
+import django
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2] # Directory holding manage.py
+
+
+def setup_django():
+    """Makes the Django project's models (dashboard app) usable from the Streamlit process."""
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.append(str(PROJECT_ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "googlelogin.settings")
+    django.setup()
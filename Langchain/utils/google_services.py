@@ -1,7 +1,16 @@
 # utils/google_services.py
 from googleapiclient.discovery import build
 
+from utils.http_transport import build_pooled_http
+from utils.tracing import span
+
+def get_classroom_service(creds, http=None):
+    return build("classroom", "v1", http=http or build_pooled_http(creds))
+
 def get_service(creds):
-    gcr = build("classroom", "v1", credentials=creds)
-    calendar_service = build("calendar", "v3", credentials=creds)
+    # Both clients share one transport on the process-wide pool, so a refresh reuses open TLS connections
+    with span("google.get_service"):
+        http = build_pooled_http(creds)
+        gcr = get_classroom_service(creds, http=http)
+        calendar_service = build("calendar", "v3", http=http)
     return gcr, calendar_service
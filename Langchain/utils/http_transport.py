@@ -0,0 +1,126 @@
+# utils/http_transport.py
+import os
+import socket
+import threading
+
+import httplib2
+import requests
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled sockets also enable TCP keep-alive probes."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class PooledHttp:
+    """
+    httplib2.Http-compatible transport for googleapiclient backed by an
+    AuthorizedSession (requests + urllib3 connection pools).
+    Unlike httplib2.Http it can be shared between threads, and connections (and
+    their TLS sessions) are reused across requests and across API clients.
+    Pass a shared `adapter` to reuse one connection pool across credentials; close()
+    then leaves the pool open for its other users.
+    """
+
+    def __init__(self, credentials, pool_connections=10, pool_maxsize=20, connect_timeout=5.0,
+                 read_timeout=60.0, keep_alive=True, max_retries=0, adapter=None):
+        self.credentials = credentials # Lets googleapiclient refresh/apply auth inside batch requests
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = AuthorizedSession(credentials)
+        self._owns_adapter = adapter is None
+        if adapter is None:
+            adapter = _build_adapter(pool_connections, pool_maxsize, keep_alive, max_retries)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # googleapiclient already asks for gzip (accept-encoding plus "(gzip)" in the user agent);
+        # this covers any request that bypasses its model layer.
+        self.session.headers["Accept-Encoding"] = "gzip"
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        try:
+            response = self.session.request(
+                method, uri,
+                data=body,
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=redirections > 0,
+            )
+        # googleapiclient's num_retries only retries socket.timeout and the built-in
+        # ConnectionError; requests' own exceptions would otherwise fail on the first try.
+        except requests.exceptions.Timeout as e:
+            raise socket.timeout(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # requests has already decompressed the body; mirror httplib2, which hides the
+        # original encoding so nothing tries to decode it a second time.
+        if "content-encoding" in info:
+            info["-content-encoding"] = info.pop("content-encoding")
+            info["content-length"] = str(len(response.content))
+        info["status"] = str(response.status_code)
+        http_response = httplib2.Response(info)
+        http_response.reason = response.reason
+        return http_response, response.content
+
+    def close(self):
+        if self._owns_adapter:
+            self.session.close()
+
+
+def _build_adapter(pool_connections, pool_maxsize, keep_alive, max_retries):
+    adapter_class = _KeepAliveAdapter if keep_alive else HTTPAdapter
+    return adapter_class(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+
+
+_shared_adapter = None
+_shared_adapter_lock = threading.Lock()
+
+
+def _get_shared_adapter():
+    """Process-wide connection pool; every PooledHttp from build_pooled_http draws from it."""
+    global _shared_adapter
+    with _shared_adapter_lock:
+        if _shared_adapter is None:
+            _shared_adapter = _build_adapter(
+                _env_int("GOOGLE_HTTP_POOL_CONNECTIONS", 10),
+                _env_int("GOOGLE_HTTP_POOL_MAXSIZE", 20),
+                os.environ.get("GOOGLE_HTTP_KEEPALIVE", "1") != "0",
+                _env_int("GOOGLE_HTTP_MAX_RETRIES", 0),
+            )
+        return _shared_adapter
+
+
+def build_pooled_http(credentials):
+    """
+    PooledHttp for `credentials` on the process-wide connection pool, so per-user clients
+    (Django push re-fetches, store calls) reuse open connections instead of each opening
+    their own. Configured from the environment:
+    GOOGLE_HTTP_POOL_CONNECTIONS (host pools), GOOGLE_HTTP_POOL_MAXSIZE (connections per host),
+    GOOGLE_HTTP_CONNECT_TIMEOUT / GOOGLE_HTTP_READ_TIMEOUT (seconds), GOOGLE_HTTP_KEEPALIVE (0/1),
+    GOOGLE_HTTP_MAX_RETRIES (connection-level retries).
+    """
+    return PooledHttp(
+        credentials,
+        connect_timeout=_env_float("GOOGLE_HTTP_CONNECT_TIMEOUT", 5),
+        read_timeout=_env_float("GOOGLE_HTTP_READ_TIMEOUT", 60),
+        keep_alive=os.environ.get("GOOGLE_HTTP_KEEPALIVE", "1") != "0",
+        adapter=_get_shared_adapter(),
+    )
@@ -0,0 +1,57 @@
+# utils/intervals.py
+import bisect
+
+
+class IntervalIndex:
+    """
+    Sorted set of disjoint half-open [start, end) intervals.
+    Overlapping or touching intervals are merged on insert, so lookups and gap
+    scans are a bisect plus a walk over only the intervals in range.
+    Works with any ordered values (datetimes, ints, ...).
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        # Bulk load: one sort and a linear merge instead of repeated inserts.
+        for start, end in sorted(iv for iv in intervals if iv[1] > iv[0]):
+            if self._ends and start <= self._ends[-1]:
+                if end > self._ends[-1]:
+                    self._ends[-1] = end
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def add(self, start, end):
+        if end <= start:
+            return
+        # Intervals i..j-1 overlap or touch [start, end)
+        i = bisect.bisect_left(self._ends, start)
+        j = bisect.bisect_right(self._starts, end)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def overlaps(self, start, end):
+        i = bisect.bisect_right(self._ends, start)
+        return i < len(self._starts) and self._starts[i] < end
+
+    def free_slots(self, start, end):
+        """Yields the (gap_start, gap_end) pairs inside [start, end) not covered by any interval."""
+        cursor = start
+        i = bisect.bisect_right(self._ends, start)
+        while i < len(self._starts) and self._starts[i] < end:
+            if self._starts[i] > cursor:
+                yield cursor, self._starts[i]
+            cursor = max(cursor, self._ends[i])
+            i += 1
+        if cursor < end:
+            yield cursor, end
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def __len__(self):
+        return len(self._starts)
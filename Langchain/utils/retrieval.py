@@ -0,0 +1,232 @@
+# utils/retrieval.py
+import datetime
+import hashlib
+import re
+import threading
+
+import numpy as np
+
+from google_api.classroom import SUBMITTED_STATES
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "with", "you", "your", "will",
+}
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _document_tokens(item):
+    # Titles are short but the strongest signal, so they count twice.
+    title_tokens = tokenize(item.get("title"))
+    return title_tokens + title_tokens + tokenize(item.get("course_name")) + tokenize(item.get("description"))
+
+
+def _content_hash(item):
+    raw = "\x1f".join(str(item.get(k, "")) for k in ("title", "description", "course_name", "due_date", "due_time", "state"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _due_datetime(item):
+    due_date = item.get("due_date") or {}
+    if not (due_date.get("year") and due_date.get("month") and due_date.get("day")):
+        return None
+    due_time = item.get("due_time") or {}
+    return datetime.datetime(
+        due_date["year"], due_date["month"], due_date["day"],
+        due_time.get("hours", 23), due_time.get("minutes", 59)
+    )
+
+
+class AssignmentIndex:
+    """
+    Local TF-IDF index over coursework snapshot items (see google_api.classroom).
+    Each item keeps its term ids and counts as small NumPy arrays; on the first search
+    after a change they are packed into flat CSR-style arrays and weighted, so memory
+    and scoring cost grow with the number of non-zero terms rather than items x vocab.
+    Upserts skip items whose content hash is unchanged.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vocab = {}
+        self._keys = []
+        self._items = []
+        self._term_ids = []
+        self._term_counts = []
+        self._rows = {}
+        self._hashes = {}
+        self._packed = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _vectorize(self, item):
+        counts = {}
+        for token in _document_tokens(item):
+            column = self._vocab.get(token)
+            if column is None:
+                column = len(self._vocab)
+                self._vocab[token] = column
+            counts[column] = counts.get(column, 0) + 1
+        term_ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        term_counts = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return term_ids, term_counts
+
+    def _upsert_locked(self, item):
+        key = item["key"]
+        content_hash = _content_hash(item)
+        if self._hashes.get(key) == content_hash:
+            return False
+
+        term_ids, term_counts = self._vectorize(item)
+        row = self._rows.get(key)
+        if row is None:
+            self._rows[key] = len(self._keys)
+            self._keys.append(key)
+            self._items.append(item)
+            self._term_ids.append(term_ids)
+            self._term_counts.append(term_counts)
+        else:
+            self._items[row] = item
+            self._term_ids[row] = term_ids
+            self._term_counts[row] = term_counts
+        self._hashes[key] = content_hash
+        return True
+
+    def _remove_locked(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        self._hashes.pop(key, None)
+        # Swap-remove: move the last row into the hole so rows stay dense.
+        last = len(self._keys) - 1
+        if row != last:
+            for rows in (self._keys, self._items, self._term_ids, self._term_counts):
+                rows[row] = rows[last]
+            self._rows[self._keys[row]] = row
+        for rows in (self._keys, self._items, self._term_ids, self._term_counts):
+            rows.pop()
+        return True
+
+    def upsert(self, items):
+        """Adds or updates items; unchanged items are skipped. Returns how many rows changed."""
+        with self._lock:
+            changed = sum(1 for item in items if self._upsert_locked(item))
+            if changed:
+                self._packed = None
+            return changed
+
+    def remove(self, keys):
+        with self._lock:
+            removed = sum(1 for key in keys if self._remove_locked(key))
+            if removed:
+                self._packed = None
+            return removed
+
+    def sync(self, items):
+        """Makes the index match a full snapshot: upserts every item and drops keys that disappeared."""
+        items = list(items)
+        live_keys = {item["key"] for item in items}
+        with self._lock:
+            changed = sum(1 for key in [k for k in self._keys if k not in live_keys] if self._remove_locked(key))
+            changed += sum(1 for item in items if self._upsert_locked(item))
+            if changed:
+                self._packed = None
+            return changed
+
+    def _pack_locked(self):
+        """Flattens rows into (row_ids, term_ids, weights) with L2-normalized TF-IDF weights."""
+        if self._packed is not None:
+            return self._packed
+        n_docs = len(self._keys)
+        lengths = np.fromiter((len(t) for t in self._term_ids), dtype=np.int64, count=n_docs)
+        row_ids = np.repeat(np.arange(n_docs), lengths)
+        term_ids = np.concatenate(self._term_ids) if n_docs else np.zeros(0, dtype=np.int64)
+        counts = np.concatenate(self._term_counts) if n_docs else np.zeros(0, dtype=np.float32)
+
+        doc_freq = np.bincount(term_ids, minlength=len(self._vocab))
+        idf = (np.log((1.0 + n_docs) / (1.0 + doc_freq)) + 1.0).astype(np.float32)
+        weights = np.log1p(counts) * idf[term_ids]
+        norms = np.sqrt(np.bincount(row_ids, weights=weights * weights, minlength=n_docs))
+        norms[norms == 0] = 1.0
+        weights = weights / norms[row_ids]
+        self._packed = (row_ids, term_ids, weights, idf)
+        return self._packed
+
+    def search(self, query, k=5):
+        """Returns up to k (score, item) pairs ranked by cosine similarity to the query."""
+        with self._lock:
+            n_docs = len(self._keys)
+            if n_docs == 0:
+                return []
+            row_ids, term_ids, weights, idf = self._pack_locked()
+
+            query_counts = {}
+            for token in tokenize(query):
+                column = self._vocab.get(token)
+                if column is not None:
+                    query_counts[column] = query_counts.get(column, 0) + 1
+            if not query_counts:
+                return []
+            query_vector = np.zeros(len(idf), dtype=np.float32)
+            for column, count in query_counts.items():
+                query_vector[column] = np.log1p(count) * idf[column]
+            query_vector /= np.linalg.norm(query_vector)
+
+            scores = np.bincount(row_ids, weights=weights * query_vector[term_ids], minlength=n_docs)
+            k = min(k, n_docs)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[row]), self._items[row]) for row in top if scores[row] > 0]
+
+    def upcoming(self, now, limit=10):
+        """The next `limit` not-submitted items due after `now`, soonest first."""
+        with self._lock:
+            dated = []
+            for item in self._items:
+                due = _due_datetime(item)
+                if due is not None and due >= now and item.get("state") not in SUBMITTED_STATES:
+                    dated.append((due, item))
+        dated.sort(key=lambda pair: pair[0])
+        return [item for _, item in dated[:limit]]
+
+    def overview(self, now, limit=10):
+        """
+        Bounded context string for the agent prompt: totals plus the next few due items.
+        Its size does not grow with the number of courses.
+        """
+        with self._lock:
+            total = len(self._keys)
+            course_count = len({item["course_id"] for item in self._items})
+            pending = sum(1 for item in self._items if item.get("state") not in SUBMITTED_STATES)
+        if total == 0:
+            return "No assignments indexed yet."
+        lines = [f"{total} assignments across {course_count} courses; {pending} not submitted."]
+        upcoming = self.upcoming(now, limit=limit)
+        if upcoming:
+            lines.append("Next due (not submitted):")
+            lines.extend(format_item(item) for item in upcoming)
+        return "\n".join(lines)
+
+
+def format_item(item, max_description=200):
+    due = _due_datetime(item)
+    due_str = due.strftime("%Y-%m-%d %H:%M") if due else "N/A"
+    state = item.get("state") or "NOT_SUBMITTED"
+    line = f"- [{item.get('course_name')}] {item.get('title')} | Due: {due_str} | Status: {state}"
+    description = (item.get("description") or "").strip()
+    if description:
+        if len(description) > max_description:
+            description = description[:max_description].rstrip() + "..."
+        line += f"\n  {description}"
+    return line
+
+
+def format_results(results):
+    if not results:
+        return "No matching assignments found."
+    return "\n".join(format_item(item) for _, item in results)
@@ -0,0 +1,367 @@
+# utils/tracing.py
+"""
+Lightweight hierarchical tracing for the refresh and chat pipelines.
+
+    with span("classroom.course", **{"course.id": course_id}) as s:
+        ...
+        s.set_attribute("item.count", len(items))
+
+Spans nest through a ContextVar, so children started anywhere below a span
+(including in job-server workers, which run with the submitter's context)
+are attached to it. Finished spans are appended to a local file, either as
+flat JSON lines or as OTLP/JSON (one ExportTraceServiceRequest per line, the
+format the OpenTelemetry collector's file receiver reads).
+
+Configured from the environment; tracing is off unless TRACE_EXPORT_PATH is set:
+TRACE_EXPORT_PATH, TRACE_EXPORT_FORMAT (jsonl | otlp), TRACE_SAMPLE_RATE (0..1,
+decided per trace), TRACE_PROFILE_INTERVAL_MS (enables the sampling profiler).
+
+`python -m utils.tracing <file>` prints the slowest span names of an export.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "classroom-assistant"
+PROFILE_TOP_STACKS = 5 # Hottest stacks attached to a span by the sampling profiler
+PROFILE_STACK_DEPTH = 30
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def estimate_tokens(text):
+    """Rough token count for LLM input/output (about four characters per token)."""
+    return math.ceil(len(text or "") / 4)
+
+
+class Span:
+    sampled = True
+
+    def __init__(self, tracer, name, trace_id, parent_id, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self.thread_name = threading.current_thread().name
+        self.profile = None # Counter of folded stacks, filled by the sampling profiler
+        self.profile_lock = threading.Lock() # The profiler thread adds samples while end() may be reading
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record_error(self, error):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        with self.profile_lock:
+            profile = Counter(self.profile) if self.profile else None
+        if profile:
+            self.attributes["profile.samples"] = sum(profile.values())
+            self.attributes["profile.hot_stacks"] = [
+                f"{stack} {count}" for stack, count in profile.most_common(PROFILE_TOP_STACKS)
+            ]
+        self.tracer.exporter.export(self)
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "thread": self.thread_name,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1, # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Stands in for spans that are not recorded (tracing off or trace not sampled)."""
+    sampled = False
+    trace_id = span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+class FileSpanExporter:
+    """Appends finished spans to a local file, one JSON document per line."""
+
+    def __init__(self, path, format="jsonl"):
+        if format not in ("jsonl", "otlp"):
+            raise ValueError(f"Unknown trace export format: {format}")
+        self.path = path
+        self.format = format
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def export(self, span):
+        if self.format == "otlp":
+            record = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp()]}],
+            }]}
+        else:
+            record = span.to_dict()
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if not self._file.closed: # Spans ending during interpreter shutdown are dropped
+                self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread that is inside a span, every
+    `interval_seconds`, and counts folded stacks ("module:function;...") on the
+    innermost active span. Spans then carry their own hot paths, so slow stages
+    can be explained without a separate profiler run.
+    """
+
+    def __init__(self, interval_seconds=0.01):
+        self.interval_seconds = interval_seconds
+        self._active = {} # thread id -> innermost active span on that thread
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def enter(self, span):
+        thread_id = threading.get_ident()
+        previous = self._active.get(thread_id)
+        self._active[thread_id] = span
+        return previous
+
+    def exit(self, previous):
+        thread_id = threading.get_ident()
+        if previous is None:
+            self._active.pop(thread_id, None)
+        else:
+            self._active[thread_id] = previous
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frames = sys._current_frames()
+            for thread_id, span in list(self._active.items()):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = _fold_stack(frame)
+                with span.profile_lock:
+                    if span.profile is None:
+                        span.profile = Counter()
+                    span.profile[stack] += 1
+
+
+def _fold_stack(frame):
+    names = []
+    while frame is not None and len(names) < PROFILE_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate=1.0, profiler=None):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.profiler = profiler
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def start_span(self, name, parent=None, **attributes):
+        """Creates a span under `parent` (default: the current span) without making it current."""
+        if parent is None:
+            parent = _current_span.get()
+        if not self.enabled or (parent is not None and not parent.sampled):
+            return NOOP_SPAN
+        if parent is None:
+            # Sampling is decided once per trace, at its root span
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return NOOP_SPAN
+            return Span(self, name, os.urandom(16).hex(), None, attributes)
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Runs the block inside a new current span; exceptions are recorded and re-raised."""
+        current = self.start_span(name, **attributes)
+        token = _current_span.set(current)
+        profiled = self.profiler is not None and current.sampled
+        previous = self.profiler.enter(current) if profiled else None
+        try:
+            yield current
+        except BaseException as e:
+            current.record_error(e)
+            raise
+        finally:
+            if profiled:
+                self.profiler.exit(previous)
+            _current_span.reset(token)
+            current.end()
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Process-wide tracer, configured from the TRACE_* environment variables."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            path = os.environ.get("TRACE_EXPORT_PATH")
+            exporter = profiler = None
+            if path:
+                try:
+                    exporter = FileSpanExporter(path, os.environ.get("TRACE_EXPORT_FORMAT", "jsonl"))
+                except (OSError, ValueError) as e:
+                    logger.error(f"Tracing disabled, could not open trace export {path}: {e}")
+            if exporter is not None:
+                atexit.register(exporter.close)
+                interval_ms = os.environ.get("TRACE_PROFILE_INTERVAL_MS")
+                if interval_ms:
+                    profiler = SamplingProfiler(float(interval_ms) / 1000)
+                    profiler.start()
+                logger.info(f"Tracing spans to {path} ({exporter.format}).")
+            _tracer = Tracer(exporter, float(os.environ.get("TRACE_SAMPLE_RATE", "1")), profiler)
+        return _tracer
+
+
+def span(name, **attributes):
+    """Shorthand for get_tracer().span(...)."""
+    return get_tracer().span(name, **attributes)
+
+
+def _read_spans(path):
+    """Yields (name, duration_ms, error) from a jsonl or otlp export."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "resourceSpans" not in record:
+                yield record["name"], record["duration_ms"], record.get("error")
+                continue
+            for resource_spans in record["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    for s in scope_spans["spans"]:
+                        duration = (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+                        yield s["name"], duration, s.get("status", {}).get("message")
+
+
+def summarize(path):
+    """Per span name: count, errors, total/p50/p95/max milliseconds, slowest total first."""
+    durations = defaultdict(list)
+    errors = Counter()
+    for name, duration, error in _read_spans(path):
+        durations[name].append(duration)
+        if error:
+            errors[name] += 1
+    rows = []
+    for name, values in durations.items():
+        values.sort()
+        rows.append({
+            "name": name,
+            "count": len(values),
+            "errors": errors[name],
+            "total_ms": round(sum(values), 1),
+            "p50_ms": round(values[len(values) // 2], 1),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+            "max_ms": round(values[-1], 1),
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m utils.tracing <trace export file>")
+    print(f"{'span':<40} {'count':>6} {'errors':>6} {'total ms':>10} {'p50':>8} {'p95':>8} {'max':>8}")
+    for row in summarize(sys.argv[1]):
+        print(f"{row['name']:<40} {row['count']:>6} {row['errors']:>6} {row['total_ms']:>10} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['max_ms']:>8}")
@@ -0,0 +1,145 @@
+"""
+Persistent chat history for the Streamlit assistant.
+
+Turns are appended to an in-memory buffer and written behind in batches by a
+background thread, so a chat turn never waits on the database. History is read
+back lazily, one page at a time, newest first, through the (user_key, -created_at)
+index; callers only ever hold the page they are showing. Pages are keyed by
+(created_at, id), so turns sharing a timestamp are never skipped or repeated.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ConversationTurn
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20 # Chat messages per page of history
+
+
+class ConversationStore:
+    def __init__(self, flush_interval_seconds=1.0, batch_size=50, max_buffered=5000):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.dropped = 0 # Turns discarded because the buffer was full; reset once a write succeeds
+        self._buffer = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def append(self, user_key, role, content, session_id=""):
+        """
+        Buffers a turn and returns it as a chat message dict ({"type", "content",
+        "created_at", "id"}); "id" is None until the turn is written, then filled in.
+        """
+        turn = ConversationTurn(
+            user_key=user_key, session_id=session_id, role=role, content=content, created_at=timezone.now()
+        )
+        message = {"type": turn.role, "content": turn.content, "created_at": turn.created_at, "id": None}
+        with self._condition:
+            self._buffer.append((turn, message))
+            self._trim_locked()
+            self._ensure_thread_locked()
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+        return message
+
+    def flush(self):
+        """Writes all buffered turns in one bulk insert. Returns how many were written."""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                ConversationTurn.objects.bulk_create([turn for turn, _ in batch])
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} conversation turn(s): {e}", exc_info=True)
+                with self._condition:
+                    self._buffer[:0] = batch # Keep them for the next attempt, up to max_buffered
+                    self._trim_locked()
+                return 0
+            with self._condition:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                logger.warning(f"Conversation store is writing again; {dropped} turn(s) were dropped meanwhile.")
+            for turn, message in batch:
+                message["id"] = turn.pk # Set by bulk_create on backends that return inserted ids
+            return len(batch)
+
+    def load_page(self, user_key, before=None, limit=PAGE_SIZE):
+        """
+        Returns (messages, has_older): up to `limit` turns older than `before`,
+        oldest first. `before` is the (created_at, id) of the oldest message the
+        caller holds; None means newest. An id of None (the turn is not written yet)
+        also returns turns sharing that created_at, which the caller must de-duplicate.
+        """
+        with self._condition:
+            has_buffered = any(turn.user_key == user_key for turn, _ in self._buffer)
+        if has_buffered:
+            self.flush()
+
+        queryset = ConversationTurn.objects.filter(user_key=user_key)
+        if before is not None:
+            created_at, turn_id = before
+            if turn_id is None:
+                older = Q(created_at__lte=created_at)
+            else:
+                older = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=turn_id)
+            queryset = queryset.filter(older)
+        # One extra row tells us whether an older page exists without a COUNT query
+        rows = list(
+            queryset.order_by("-created_at", "-id").values("id", "role", "content", "created_at")[:limit + 1]
+        )
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        return [
+            {"type": r["role"], "content": r["content"], "created_at": r["created_at"], "id": r["id"]} for r in rows
+        ], has_older
+
+    def _trim_locked(self):
+        """Drops the oldest buffered turns beyond max_buffered, so a database outage cannot exhaust memory."""
+        overflow = len(self._buffer) - self.max_buffered
+        if overflow <= 0:
+            return
+        if not self.dropped:
+            logger.error(f"Conversation buffer is full ({self.max_buffered} turns); dropping the oldest turns.")
+        del self._buffer[:overflow]
+        self.dropped += overflow
+
+    def _ensure_thread_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait(self.flush_interval_seconds)
+            self.flush()
+            close_old_connections()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore(
+                flush_interval_seconds=settings.CONVERSATION_FLUSH_SECONDS,
+                batch_size=settings.CONVERSATION_FLUSH_BATCH_SIZE,
+                max_buffered=settings.CONVERSATION_MAX_BUFFERED,
+            )
+            atexit.register(_store.flush)
+        return _store
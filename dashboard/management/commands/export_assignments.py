@@ -0,0 +1,295 @@
+import datetime
+import json
+import shutil
+import uuid
+from pathlib import Path
+
+from allauth.socialaccount.models import SocialToken
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from google_api.classroom import SUBMITTED_STATES
+
+from dashboard.models import CourseWork, Submission, SubmissionDeletion
+from dashboard.store import refresh_user
+
+STATE_FILE = "_export_state.json"
+NO_DUE_DATE = "none"
+EXPORT_VERSION = 2 # Bumped when the file schema changes; a directory holds one version only
+
+COLUMNS = [
+    ("user_id", "user_id"),
+    ("user_email", "user__email"),
+    ("course_id", "coursework__course__course_id"),
+    ("course_name", "coursework__course__name"),
+    ("coursework_id", "coursework__coursework_id"),
+    ("title", "coursework__title"),
+    ("due_date", "coursework__due_date"),
+    ("due_time", "coursework__due_time"),
+    ("state", "state"),
+    ("coursework_updated_at", "coursework__updated_at"),
+    ("submission_updated_at", "updated_at"),
+]
+
+# Tombstones for submissions deleted since the previous export; the remaining columns are null
+TOMBSTONE_COLUMNS = [
+    ("user_id", "user_id"),
+    ("course_id", "course_id"),
+    ("coursework_id", "coursework_id"),
+    ("due_date", "due_date"),
+    ("submission_updated_at", "deleted_at"),
+]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise CommandError("pyarrow is required for exports: pip install pyarrow")
+    return pyarrow
+
+
+def _schema(pa):
+    return pa.schema([
+        ("user_id", pa.int64()),
+        ("user_email", pa.string()),
+        ("course_id", pa.string()),
+        ("course_name", pa.string()),
+        ("coursework_id", pa.string()),
+        ("title", pa.string()),
+        ("due_date", pa.date32()),
+        ("due_time", pa.time32("s")),
+        ("state", pa.string()),
+        ("submitted", pa.bool_()),
+        ("coursework_updated_at", pa.timestamp("us", tz="UTC")),
+        ("submission_updated_at", pa.timestamp("us", tz="UTC")),
+        ("deleted", pa.bool_()),
+        ("export_id", pa.string()),
+    ])
+
+
+class _PartitionWriter:
+    """Writes record batches to one file per partition; rows arrive sorted by partition, so one file is open at a time."""
+
+    def __init__(self, pa, root, file_format, schema, export_id, name_suffix=""):
+        self.pa = pa
+        self.root = root
+        self.file_format = file_format
+        self.schema = schema
+        self.export_id = export_id
+        self.name_suffix = name_suffix
+        self.partition = None
+        self._writer = None
+        self._sink = None
+        self.files = []
+
+    def write(self, partition, batch):
+        if partition != self.partition:
+            self.close()
+            self._open(partition)
+        self._writer.write_batch(batch)
+
+    def _open(self, partition):
+        directory = self.root / f"due={partition}"
+        directory.mkdir(parents=True, exist_ok=True)
+        suffix = "parquet" if self.file_format == "parquet" else "arrow"
+        path = directory / f"part-{self.export_id}{self.name_suffix}.{suffix}"
+        if self.file_format == "parquet":
+            self._writer = self.pa.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            self._sink = self.pa.OSFile(str(path), "wb")
+            self._writer = self.pa.ipc.new_file(self._sink, self.schema)
+        self.partition = partition
+        self.files.append(path)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        self.partition = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports every user's coursework due dates and submission states from the local store "
+        "to Parquet or Arrow IPC files partitioned by due date (due=YYYY-MM-DD or due=YYYY-MM). "
+        "Each run only appends rows changed since the previous export, plus deleted=true tombstones "
+        "(in part-*-deleted files) for submissions removed since then; readers should keep the latest "
+        "row per (user_id, course_id, coursework_id) by submission_updated_at and drop it if deleted. "
+        "Apply that rule across all partitions: when a due date changes, the new row is written under "
+        "its new due= partition and the old one stays where it was. "
+        "Deleting a user account leaves no tombstones; re-export with --full after that."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Export directory; also holds the incremental export state.")
+        parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+        parser.add_argument("--partition", choices=["day", "month"], default="day",
+                            help="Due-date partition granularity.")
+        parser.add_argument("--chunk-size", type=int, default=5000,
+                            help="Rows read from the database and written per batch.")
+        parser.add_argument("--full", action="store_true",
+                            help="Replace the export: remove its partitions and state, then export every row again.")
+        parser.add_argument("--lag-seconds", type=int, default=60,
+                            help="Rows changed this recently wait for the next run, so writes still "
+                                 "committing during the scan are not skipped.")
+        parser.add_argument("--refresh", action="store_true",
+                            help="Re-fetch every linked user's courses from Google into the store first.")
+
+    def handle(self, *args, **options):
+        pa = _import_pyarrow()
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        if options["lag_seconds"] < 0:
+            raise CommandError("--lag-seconds must not be negative.")
+        root = Path(options["output"])
+        root.mkdir(parents=True, exist_ok=True)
+        state_path = root / STATE_FILE
+        state = json.loads(state_path.read_text()) if state_path.exists() else {}
+        for option in ("format", "partition"):
+            if state.get(option) and state[option] != options[option]:
+                raise CommandError(
+                    f"{root} holds an export with --{option} {state[option]}; use the same value or a new directory."
+                )
+        if options["full"]:
+            self._clear(root, state_path)
+            state = {}
+        elif state and state.get("version", 1) != EXPORT_VERSION:
+            raise CommandError(f"{root} holds an export in an older file layout; re-export it with --full.")
+
+        if options["refresh"]:
+            self._refresh_all()
+
+        # Rows are taken up to a high watermark read before the scan. updated_at is stamped
+        # before the writing transaction commits, so the watermark trails the clock by
+        # --lag-seconds: a row stamped earlier but committed after the scan is still newer
+        # than the watermark and is picked up by the next run.
+        low = None if options["full"] else state.get("watermark")
+        low = datetime.datetime.fromisoformat(low) if low else None
+        latest = max(
+            filter(None, [
+                Submission.objects.aggregate(m=Max("updated_at"))["m"],
+                CourseWork.objects.aggregate(m=Max("updated_at"))["m"],
+                SubmissionDeletion.objects.aggregate(m=Max("deleted_at"))["m"],
+            ]),
+            default=None,
+        )
+        lag = datetime.timedelta(seconds=options["lag_seconds"])
+        high = None if latest is None else min(latest, timezone.now() - lag)
+        if high is None or (low is not None and high <= low):
+            self.stdout.write("Nothing new to export.")
+            return
+
+        # Full exports stop at the watermark too, so the next run neither repeats nor misses rows
+        changed = Q(updated_at__lte=high, coursework__updated_at__lte=high)
+        if low is not None:
+            changed = Q(updated_at__gt=low, updated_at__lte=high) | Q(
+                coursework__updated_at__gt=low, coursework__updated_at__lte=high
+            )
+        rows = (
+            Submission.objects.filter(changed)
+            .order_by("coursework__due_date", "pk")
+            .values_list(*[field for _, field in COLUMNS])
+            .iterator(chunk_size=options["chunk_size"])
+        )
+
+        export_id = f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        schema = _schema(pa)
+        writer = _PartitionWriter(pa, root, options["format"], schema, export_id)
+        total = self._write_rows(pa, schema, writer, COLUMNS, rows, False, export_id, options)
+        files = list(writer.files)
+        if low is not None:
+            # A full export only holds live rows, so it needs no tombstones
+            deletions = (
+                SubmissionDeletion.objects.filter(deleted_at__gt=low, deleted_at__lte=high)
+                .order_by("due_date", "pk")
+                .values_list(*[field for _, field in TOMBSTONE_COLUMNS])
+                .iterator(chunk_size=options["chunk_size"])
+            )
+            writer = _PartitionWriter(pa, root, options["format"], schema, export_id, name_suffix="-deleted")
+            total += self._write_rows(pa, schema, writer, TOMBSTONE_COLUMNS, deletions, True, export_id, options)
+            files += writer.files
+
+        state.update({
+            "version": EXPORT_VERSION,
+            "format": options["format"],
+            "partition": options["partition"],
+            "watermark": high.isoformat(),
+            "last_export_id": export_id,
+            "last_export_rows": total,
+        })
+        state_path.write_text(json.dumps(state, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {total} row(s) to {len(files)} file(s) in {root} (watermark {high.isoformat()})."
+        ))
+
+    def _write_rows(self, pa, schema, writer, columns, rows, deleted, export_id, options):
+        """Streams `rows` (value tuples for `columns`, sorted by due date) to the writer in chunks."""
+        total = 0
+        try:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= options["chunk_size"]:
+                    total += self._write_chunk(pa, schema, writer, columns, chunk, deleted, export_id, options["partition"])
+                    chunk = []
+            if chunk:
+                total += self._write_chunk(pa, schema, writer, columns, chunk, deleted, export_id, options["partition"])
+        finally:
+            writer.close()
+        return total
+
+    def _write_chunk(self, pa, schema, writer, columns, chunk, deleted, export_id, granularity):
+        """Splits a chunk (sorted by due date) into runs of one partition and writes each as a record batch."""
+        names = [name for name, _ in columns]
+        due_index = names.index("due_date")
+        start = 0
+        while start < len(chunk):
+            partition = self._partition(chunk[start][due_index], granularity)
+            end = start + 1
+            while end < len(chunk) and self._partition(chunk[end][due_index], granularity) == partition:
+                end += 1
+            run = chunk[start:end]
+            values = {name: [row[i] for row in run] for i, name in enumerate(names)}
+            if "state" in values:
+                values["submitted"] = [state in SUBMITTED_STATES for state in values["state"]]
+            values["deleted"] = [deleted] * len(run)
+            values["export_id"] = [export_id] * len(run)
+            batch = pa.record_batch([values.get(field.name, [None] * len(run)) for field in schema], schema=schema)
+            writer.write(partition, batch)
+            start = end
+        return len(chunk)
+
+    def _clear(self, root, state_path):
+        """Removes a previous export's partitions and state so a full export does not mix with it."""
+        partitions = [path for path in root.glob("due=*") if path.is_dir()]
+        # State first: if the export fails halfway, the next run must not trust the old watermark
+        state_path.unlink(missing_ok=True)
+        for path in partitions:
+            shutil.rmtree(path)
+        if partitions:
+            self.stdout.write(f"Removed {len(partitions)} partition(s) of the previous export from {root}.")
+
+    @staticmethod
+    def _partition(due_date, granularity):
+        if due_date is None:
+            return NO_DUE_DATE
+        return due_date.strftime("%Y-%m-%d" if granularity == "day" else "%Y-%m")
+
+    def _refresh_all(self):
+        tokens = SocialToken.objects.filter(account__provider="google").select_related("account__user")
+        for token in tokens:
+            user = token.account.user
+            try:
+                course_count = refresh_user(user)
+            except Exception as e:
+                # One user's revoked token should not stop the export for everyone else
+                self.stderr.write(f"Could not refresh {user}: {e}")
+                continue
+            self.stdout.write(f"Refreshed {course_count} course(s) for {user}")
@@ -0,0 +1,58 @@
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.models import ClassroomRegistration
+from dashboard.store import get_user_classroom_service, refresh_course
+
+
+class Command(BaseCommand):
+    help = (
+        "Registers Classroom course-work change notifications for a user's courses. "
+        "Registrations expire after about a week, so run this periodically to renew them. "
+        "Each registered course is also fetched into the local store, since notifications only "
+        "carry the items that change afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="Email of the user whose courses should push changes.")
+        parser.add_argument("--topic", default=settings.CLASSROOM_PUSH_TOPIC,
+                            help="Pub/Sub topic, projects/<project>/topics/<topic>.")
+
+    def handle(self, *args, **options):
+        topic = options["topic"]
+        if not topic:
+            raise CommandError("No Pub/Sub topic given (use --topic or CLASSROOM_PUSH_TOPIC).")
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}.")
+
+        service = get_user_classroom_service(user)
+        courses = service.courses().list(studentId="me", courseStates=["ACTIVE"]).execute().get("courses", [])
+        for course in courses:
+            registration = service.registrations().create(body={
+                "feed": {
+                    "feedType": "COURSE_WORK_CHANGES",
+                    "courseWorkChangesInfo": {"courseId": course["id"]},
+                },
+                "cloudPubsubTopic": {"topicName": topic},
+            }).execute()
+            expires_at = None
+            if registration.get("expiryTime"):
+                expires_at = datetime.datetime.fromisoformat(registration["expiryTime"].replace("Z", "+00:00"))
+            ClassroomRegistration.objects.update_or_create(
+                registration_id=registration["registrationId"],
+                defaults={"user": user, "course_id": course["id"], "expires_at": expires_at},
+            )
+            # Seed the whole course; pushes only report later changes
+            refresh_course(user, course["id"], service=service)
+            self.stdout.write(f"Registered {course.get('name', course['id'])} until {expires_at or 'unknown'}")
+
+        # Renewals create new registrations; older ones for the same feeds are no longer needed
+        ClassroomRegistration.objects.filter(
+            user=user, expires_at__lt=datetime.datetime.now(datetime.timezone.utc)
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f"{len(courses)} course(s) registered for push notifications."))
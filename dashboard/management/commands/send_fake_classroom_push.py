@@ -0,0 +1,46 @@
+import time
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.push import COURSE_WORK_COLLECTION, SUBMISSION_COLLECTION, build_push_envelope
+
+
+class Command(BaseCommand):
+    help = "Posts fake Pub/Sub push messages for Classroom notifications to the local ingest endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("registration_id")
+        parser.add_argument("course_id")
+        parser.add_argument("coursework_ids", nargs="+", help="Coursework ids; the burst cycles through them.")
+        parser.add_argument("--event", default="MODIFIED", choices=["CREATED", "MODIFIED", "DELETED"])
+        parser.add_argument("--submission", action="store_true",
+                            help="Send studentSubmissions notifications instead of courseWork ones.")
+        parser.add_argument("--count", type=int, default=1, help="Number of messages to send.")
+        parser.add_argument("--interval", type=float, default=0.0, help="Seconds between messages.")
+        parser.add_argument("--url", default="http://127.0.0.1:8000/classroom/push/")
+        parser.add_argument("--token", default=settings.CLASSROOM_PUSH_TOKEN)
+
+    def handle(self, *args, **options):
+        url = f"{options['url']}?token={options['token']}"
+        collection = SUBMISSION_COLLECTION if options["submission"] else COURSE_WORK_COLLECTION
+        coursework_ids = options["coursework_ids"]
+        for i in range(options["count"]):
+            body = build_push_envelope(
+                options["registration_id"], options["course_id"], coursework_ids[i % len(coursework_ids)],
+                event_type=options["event"], collection=collection,
+            )
+            request = Request(url, data=body.encode("utf-8"), method="POST",
+                              headers={"Content-Type": "application/json"})
+            try:
+                with urlopen(request, timeout=10) as response:
+                    status = response.status
+            except HTTPError as e:
+                status = e.code
+            except URLError as e:
+                raise CommandError(f"Could not reach {options['url']}: {e}")
+            self.stdout.write(f"[{i + 1}/{options['count']}] HTTP {status}")
+            if options["interval"] and i + 1 < options["count"]:
+                time.sleep(options["interval"])
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassroomRegistration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registration_id', models.CharField(max_length=255, unique=True)),
+                ('course_id', models.CharField(max_length=100)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='classroom_registrations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseWork',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coursework_id', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('due_time', models.TimeField(blank=True, null=True)),
+                ('update_time', models.CharField(blank=True, max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coursework', to='dashboard.course')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(blank=True, max_length=50)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('coursework', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='dashboard.coursework')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='classroom_submissions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='coursework',
+            constraint=models.UniqueConstraint(fields=('course', 'coursework_id'), name='unique_coursework_per_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='submission',
+            constraint=models.UniqueConstraint(fields=('user', 'coursework'), name='unique_submission_per_user'),
+        ),
+    ]
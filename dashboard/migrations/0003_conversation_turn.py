@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_classroom_push_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_key', models.CharField(max_length=255)),
+                ('session_id', models.CharField(blank=True, max_length=64)),
+                ('role', models.CharField(choices=[('human', 'Human'), ('ai', 'AI')], max_length=10)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_key', '-created_at'], name='conversation_user_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_conversation_turn'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('course_id', models.CharField(max_length=100)),
+                ('coursework_id', models.CharField(max_length=100)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 class Course(models.Model):
     course_id = models.CharField(max_length=100, unique=True)
@@ -8,3 +10,81 @@ class Course(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class CourseWork(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='coursework')
+    coursework_id = models.CharField(max_length=100)
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    due_date = models.DateField(null=True, blank=True)
+    due_time = models.TimeField(null=True, blank=True)
+    update_time = models.CharField(max_length=64, blank=True)  # Classroom's updateTime, as returned
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'coursework_id'], name='unique_coursework_per_course'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class Submission(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='classroom_submissions')
+    coursework = models.ForeignKey(CourseWork, on_delete=models.CASCADE, related_name='submissions')
+    state = models.CharField(max_length=50, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'coursework'], name='unique_submission_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.coursework} ({self.state or 'NO_SUBMISSION'})"
+
+
+class SubmissionDeletion(models.Model):
+    """A removed Submission, kept so incremental exports can emit a tombstone row for it."""
+    user_id = models.BigIntegerField()  # Plain ids: the log must outlive the rows it describes
+    course_id = models.CharField(max_length=100)
+    coursework_id = models.CharField(max_length=100)
+    due_date = models.DateField(null=True, blank=True)  # Locates the tombstone's export partition
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.course_id}/{self.coursework_id} deleted {self.deleted_at}"
+
+
+class ClassroomRegistration(models.Model):
+    """A Classroom push-notification registration (one per user and course feed)."""
+    registration_id = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='classroom_registrations')
+    course_id = models.CharField(max_length=100)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.registration_id} ({self.course_id})"
+
+
+class ConversationTurn(models.Model):
+    """One chat message between a user and the assistant."""
+    HUMAN = 'human'
+    AI = 'ai'
+    ROLE_CHOICES = [(HUMAN, 'Human'), (AI, 'AI')]
+
+    user_key = models.CharField(max_length=255)  # Google account id (primary calendar id) of the Streamlit user
+    session_id = models.CharField(max_length=64, blank=True)
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    content = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_key', '-created_at'], name='conversation_user_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_key} [{self.role}] {self.content[:50]}"
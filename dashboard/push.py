@@ -0,0 +1,210 @@
+"""
+Classroom push notifications delivered through a Pub/Sub push subscription.
+
+Notifications are parsed into (user, course, coursework) changes and handed to a
+NotificationCoalescer, which debounces bursts per course: repeated changes to the
+same item collapse into one re-fetch, and many changed items in one course
+collapse into a single course re-fetch.
+"""
+import base64
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+
+from . import store
+
+logger = logging.getLogger(__name__)
+
+COURSE_WORK_COLLECTION = "courses.courseWork"
+SUBMISSION_COLLECTION = "courses.courseWork.studentSubmissions"
+DELETED = "DELETED"
+
+
+class InvalidPushMessage(ValueError):
+    pass
+
+
+def parse_push_message(body):
+    """
+    Decodes a Pub/Sub push envelope carrying a Classroom notification.
+    Returns {"registration_id", "message_id", "collection", "event_type", "course_id", "coursework_id"}.
+    """
+    try:
+        envelope = json.loads(body)
+        message = envelope["message"]
+        data = json.loads(base64.b64decode(message["data"]))
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidPushMessage(f"Malformed push message: {e}") from e
+
+    attributes = message.get("attributes") or {}
+    resource_id = data.get("resourceId") or {}
+    collection = data.get("collection", "")
+    if collection == COURSE_WORK_COLLECTION:
+        coursework_id = resource_id.get("id")
+    elif collection == SUBMISSION_COLLECTION:
+        coursework_id = resource_id.get("courseWorkId")
+    else:
+        raise InvalidPushMessage(f"Unsupported notification collection: {collection!r}")
+
+    course_id = resource_id.get("courseId")
+    if not course_id:
+        raise InvalidPushMessage("Notification has no courseId.")
+    return {
+        "registration_id": attributes.get("registrationId") or data.get("registrationId"),
+        "message_id": message.get("messageId") or message.get("message_id"),
+        "collection": collection,
+        "event_type": data.get("eventType", ""),
+        "course_id": course_id,
+        "coursework_id": coursework_id,
+    }
+
+
+def build_push_envelope(registration_id, course_id, coursework_id, event_type="MODIFIED",
+                        collection=COURSE_WORK_COLLECTION, subscription="projects/local/subscriptions/classroom-push"):
+    """Builds the JSON body Pub/Sub would POST for a Classroom notification (used by the fake sender)."""
+    if collection == SUBMISSION_COLLECTION:
+        resource_id = {"courseId": course_id, "courseWorkId": coursework_id, "id": uuid.uuid4().hex}
+    else:
+        resource_id = {"courseId": course_id, "id": coursework_id}
+    data = {"collection": collection, "eventType": event_type, "resourceId": resource_id}
+    return json.dumps({
+        "message": {
+            "data": base64.b64encode(json.dumps(data).encode("utf-8")).decode("ascii"),
+            "attributes": {"registrationId": registration_id},
+            "messageId": uuid.uuid4().hex,
+            "publishTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "subscription": subscription,
+    })
+
+
+class _PendingCourse:
+    def __init__(self, now):
+        self.first_seen = now
+        self.last_seen = now
+        self.whole_course = False
+        self.changed = set()
+        self.deleted = set()
+
+
+class NotificationCoalescer:
+    """
+    Debounces change notifications per (user_id, course_id).
+    A batch is flushed once no new change arrived for `debounce_seconds`, or at the
+    latest `max_delay_seconds` after its first change. `handler(user_id, course_id,
+    changed_ids, deleted_ids)` receives changed_ids=None when the whole course
+    should be re-fetched. Only courseWork DELETED events count as deletions; a
+    deleted student submission belongs to one user, so its item is re-fetched
+    for that user instead.
+    """
+
+    def __init__(self, handler, debounce_seconds=5.0, max_delay_seconds=30.0, course_refetch_threshold=5):
+        self.handler = handler
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.course_refetch_threshold = course_refetch_threshold
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self.received = 0
+        self.flushed = 0
+
+    def add(self, user_id, course_id, coursework_id=None, event_type="", collection=COURSE_WORK_COLLECTION):
+        now = time.monotonic()
+        with self._condition:
+            self.received += 1
+            pending = self._pending.get((user_id, course_id))
+            if pending is None:
+                pending = self._pending[(user_id, course_id)] = _PendingCourse(now)
+            pending.last_seen = now
+            if coursework_id is None:
+                pending.whole_course = True
+            elif event_type == DELETED and collection == COURSE_WORK_COLLECTION:
+                pending.deleted.add(coursework_id)
+                pending.changed.discard(coursework_id)
+            else:
+                pending.changed.add(coursework_id)
+                pending.deleted.discard(coursework_id)
+            if len(pending.changed) > self.course_refetch_threshold:
+                pending.whole_course = True
+            self._ensure_thread_locked()
+            self._condition.notify()
+
+    def _due_at(self, pending):
+        return min(pending.last_seen + self.debounce_seconds, pending.first_seen + self.max_delay_seconds)
+
+    def _take_due_locked(self, now, force=False):
+        due = [key for key, pending in self._pending.items() if force or self._due_at(pending) <= now]
+        return [(key, self._pending.pop(key)) for key in due]
+
+    def flush(self, force=True):
+        """Runs the handler for due batches (all batches when force) on the calling thread."""
+        with self._condition:
+            batches = self._take_due_locked(time.monotonic(), force=force)
+        for (user_id, course_id), pending in batches:
+            changed = None if pending.whole_course else sorted(pending.changed)
+            try:
+                self.handler(user_id, course_id, changed, sorted(pending.deleted))
+            except Exception as e:
+                logger.error(f"Re-fetch for user {user_id}, course {course_id} failed: {e}", exc_info=True)
+            finally:
+                self.flushed += 1
+        return len(batches)
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    def _ensure_thread_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="classroom-push-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                next_due = min(self._due_at(p) for p in self._pending.values())
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+            self.flush(force=False)
+            close_old_connections()
+
+
+def refetch_changes(user_id, course_id, changed_ids, deleted_ids):
+    """Coalescer handler: applies one debounced batch to the local store."""
+    if deleted_ids:
+        store.delete_coursework(course_id, deleted_ids)
+    if changed_ids is not None and not changed_ids:
+        return
+    user = get_user_model().objects.get(pk=user_id)
+    if changed_ids is None:
+        store.refresh_course(user, course_id)
+    else:
+        store.refresh_coursework(user, course_id, changed_ids)
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer():
+    global _coalescer
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = NotificationCoalescer(
+                refetch_changes,
+                debounce_seconds=settings.CLASSROOM_PUSH_DEBOUNCE_SECONDS,
+                max_delay_seconds=settings.CLASSROOM_PUSH_MAX_DELAY_SECONDS,
+                course_refetch_threshold=settings.CLASSROOM_PUSH_COURSE_REFETCH_THRESHOLD,
+            )
+        return _coalescer
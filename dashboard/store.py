@@ -0,0 +1,274 @@
+"""
+Local store of Classroom coursework and submission state.
+
+Re-fetches reuse the Streamlit app's fetch code (Langchain/google_api/classroom.py)
+and write through bulk upserts, so one notification costs one or two API calls
+and a couple of queries. For accounts with live push registrations the Streamlit
+app reads its snapshot from here (load_snapshot) instead of re-listing Classroom.
+"""
+import datetime
+import logging
+
+from allauth.socialaccount.adapter import get_adapter
+from allauth.socialaccount.models import SocialToken
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+
+from google_api.classroom import fetch_course_items, fetch_coursework_item, fetch_coursework_snapshot
+from utils.google_services import get_classroom_service
+from utils.tracing import span
+
+from .models import ClassroomRegistration, Course, CourseWork, Submission, SubmissionDeletion
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+def get_user_credentials(user):
+    """Builds Google credentials from the user's stored allauth token, refreshing it if needed."""
+    token = SocialToken.objects.select_related("app").get(account__user=user, account__provider="google")
+    app = token.app or get_adapter().get_app(None, provider="google")
+    creds = Credentials(
+        token=token.token,
+        refresh_token=token.token_secret or None,
+        token_uri=GOOGLE_TOKEN_URI,
+        client_id=app.client_id,
+        client_secret=app.secret,
+    )
+    if not creds.valid and creds.refresh_token:
+        creds.refresh(Request())
+        token.token = creds.token
+        token.expires_at = creds.expiry.replace(tzinfo=datetime.timezone.utc) if creds.expiry else None
+        token.save(update_fields=["token", "expires_at"])
+    return creds
+
+
+def get_user_classroom_service(user):
+    return get_classroom_service(get_user_credentials(user))
+
+
+def _due_fields(item):
+    due_date = None
+    due_time = None
+    date_obj = item["due_date"] or {}
+    if date_obj.get("year") and date_obj.get("month") and date_obj.get("day"):
+        due_date = datetime.date(date_obj["year"], date_obj["month"], date_obj["day"])
+        time_obj = item["due_time"] or {}
+        if time_obj:
+            due_time = datetime.time(time_obj.get("hours", 0), time_obj.get("minutes", 0))
+    return due_date, due_time
+
+
+def store_items(user, course, items):
+    """
+    Upserts snapshot items for one course and the user's submission state for each.
+    Only new or changed rows are written, so updated_at (the export watermark) moves
+    only when Classroom data actually changed.
+    """
+    if not items:
+        return
+    fields = ["title", "description", "due_date", "due_time", "update_time"]
+    stored = {
+        row[0]: row[1:]
+        for row in CourseWork.objects.filter(course=course, coursework_id__in=[i["coursework_id"] for i in items])
+        .values_list("coursework_id", *fields)
+    }
+    coursework_rows = []
+    for item in items:
+        due_date, due_time = _due_fields(item)
+        row = CourseWork(
+            course=course,
+            coursework_id=item["coursework_id"],
+            title=item["title"][:255],
+            description=item["description"] or "",
+            due_date=due_date,
+            due_time=due_time,
+            update_time=item["update_time"] or "",
+        )
+        if stored.get(row.coursework_id) != tuple(getattr(row, field) for field in fields):
+            coursework_rows.append(row)
+    with transaction.atomic():
+        if coursework_rows:
+            CourseWork.objects.bulk_create(
+                coursework_rows,
+                update_conflicts=True,
+                unique_fields=["course", "coursework_id"],
+                update_fields=fields + ["updated_at"],
+            )
+        coursework_pks = dict(
+            CourseWork.objects.filter(course=course, coursework_id__in=[i["coursework_id"] for i in items])
+            .values_list("coursework_id", "pk")
+        )
+        stored_states = dict(
+            Submission.objects.filter(user=user, coursework_id__in=coursework_pks.values())
+            .values_list("coursework_id", "state")
+        )
+        submission_rows = []
+        for item in items:
+            coursework_pk = coursework_pks[item["coursework_id"]]
+            state = item["state"] or ""
+            if stored_states.get(coursework_pk) != state:
+                submission_rows.append(Submission(user=user, coursework_id=coursework_pk, state=state))
+        if submission_rows:
+            Submission.objects.bulk_create(
+                submission_rows,
+                update_conflicts=True,
+                unique_fields=["user", "coursework"],
+                update_fields=["state", "updated_at"],
+            )
+
+
+def _delete_submissions(submissions):
+    """Deletes submissions, logging each one so incremental exports can emit its tombstone."""
+    with transaction.atomic():
+        SubmissionDeletion.objects.bulk_create([
+            SubmissionDeletion(user_id=user_id, course_id=course_id, coursework_id=coursework_id, due_date=due_date)
+            for user_id, course_id, coursework_id, due_date in submissions.values_list(
+                "user_id", "coursework__course__course_id", "coursework__coursework_id", "coursework__due_date"
+            )
+        ])
+        deleted, _ = submissions.delete()
+    return deleted
+
+
+def _prune_for_user(user, coursework):
+    """
+    Drops the user's submissions for coursework Google no longer lists for them, then the
+    coursework rows nobody else has a submission for. Course and CourseWork rows are shared,
+    and individually assigned work is listed differently per student.
+    """
+    _delete_submissions(Submission.objects.filter(user=user, coursework__in=coursework))
+    removed, _ = coursework.filter(submissions__isnull=True).delete()
+    return removed
+
+
+def refresh_course(user, course_id, service=None):
+    """Re-fetches every coursework item of one course and drops items that no longer exist."""
+    service = service or get_user_classroom_service(user)
+    course_data = service.courses().get(id=course_id).execute()
+    course, _ = Course.objects.update_or_create(
+        course_id=course_id,
+        defaults={
+            "name": course_data.get("name", ""),
+            "section": course_data.get("section", ""),
+            "description": course_data.get("description", ""),
+        },
+    )
+    items = fetch_course_items(service, course_id, course.name)
+    store_items(user, course, items)
+    removed = _prune_for_user(user, CourseWork.objects.filter(course=course).exclude(
+        coursework_id__in=[item["coursework_id"] for item in items]
+    ))
+    logger.info(f"Refreshed course {course_id}: {len(items)} item(s), {removed} row(s) removed")
+    return len(items)
+
+
+def refresh_coursework(user, course_id, coursework_ids, service=None):
+    """Re-fetches only the given coursework items of a course (deleted items are removed locally)."""
+    course = Course.objects.filter(course_id=course_id).first()
+    if course is None:
+        # Never seen this course locally; the item needs the course row, so fetch the whole course once
+        return refresh_course(user, course_id, service=service)
+
+    service = service or get_user_classroom_service(user)
+    items = []
+    missing = []
+    for coursework_id in coursework_ids:
+        try:
+            work = service.courses().courseWork().get(courseId=course_id, id=coursework_id).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                missing.append(coursework_id)
+                continue
+            raise
+        items.append(fetch_coursework_item(service, course_id, course.name, work))
+    store_items(user, course, items)
+    if missing:
+        # Not found for this user; classmates may still have it (e.g. individually assigned work)
+        _prune_for_user(user, CourseWork.objects.filter(course=course, coursework_id__in=missing))
+    logger.info(f"Refreshed {len(items)} coursework item(s) in course {course_id}, {len(missing)} removed")
+    return len(items)
+
+
+def delete_coursework(course_id, coursework_ids):
+    coursework = CourseWork.objects.filter(course__course_id=course_id, coursework_id__in=coursework_ids)
+    with transaction.atomic():
+        _delete_submissions(Submission.objects.filter(coursework__in=coursework))
+        deleted, _ = coursework.delete()
+    return deleted
+
+
+def refresh_user(user, service=None):
+    """Re-fetches every active course of the user into the store. Returns the number of courses."""
+    service = service or get_user_classroom_service(user)
+    courses = service.courses().list(studentId="me", courseStates=["ACTIVE"]).execute().get("courses", [])
+    for course in courses:
+        refresh_course(user, course["id"], service=service)
+    return len(courses)
+
+
+def _live_registrations(user_filter):
+    return ClassroomRegistration.objects.filter(user_filter).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+    )
+
+
+def push_user_for_email(email):
+    """The user whose live push registrations keep the store current for this Google account, or None."""
+    if not email:
+        return None
+    registration = _live_registrations(Q(user__email__iexact=email)).select_related("user").first()
+    return registration.user if registration else None
+
+
+def load_snapshot(user):
+    """
+    The user's registered courses as a coursework snapshot, in the shape
+    google_api.classroom.fetch_coursework_snapshot returns, read from the store.
+    """
+    course_ids = set(_live_registrations(Q(user=user)).values_list("course_id", flat=True))
+    snapshot = {"courses": [], "items": []}
+    for course_id, name in Course.objects.filter(course_id__in=course_ids).order_by("name").values_list("course_id", "name"):
+        snapshot["courses"].append({"id": course_id, "name": name})
+    submissions = (
+        Submission.objects.filter(user=user, coursework__course__course_id__in=course_ids)
+        .select_related("coursework__course")
+        .order_by("coursework__course__name", "coursework__due_date", "coursework__pk")
+    )
+    for submission in submissions:
+        work = submission.coursework
+        snapshot["items"].append({
+            "key": f"{work.course.course_id}/{work.coursework_id}",
+            "course_id": work.course.course_id,
+            "course_name": work.course.name,
+            "coursework_id": work.coursework_id,
+            "title": work.title,
+            "description": work.description,
+            "due_date": {"year": work.due_date.year, "month": work.due_date.month, "day": work.due_date.day}
+                        if work.due_date else {},
+            "due_time": {"hours": work.due_time.hour, "minutes": work.due_time.minute} if work.due_time else {},
+            "update_time": work.update_time or None,
+            "state": submission.state or None,
+        })
+    return snapshot
+
+
+def load_account_snapshot(email, service):
+    """
+    Coursework snapshot for a Google account: read from the store when the account has live
+    push registrations (pushes keep it current), otherwise polled from Classroom via `service`.
+    """
+    push_user = None
+    try:
+        push_user = push_user_for_email(email)
+    except Exception as e:
+        logger.warning(f"Could not check push registrations for {email}; polling Classroom instead. {e}")
+    if push_user is not None:
+        with span("refresh.store"):
+            return load_snapshot(push_user)
+    return fetch_coursework_snapshot(service)
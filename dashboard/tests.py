@@ -1,3 +1,422 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import tempfile
+from pathlib import Path
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from google_api import planner
+
+from . import store
+from .conversations import ConversationStore
+from .models import ConversationTurn, Course, CourseWork, Submission, SubmissionDeletion
+from .push import (
+    COURSE_WORK_COLLECTION, SUBMISSION_COLLECTION, InvalidPushMessage, NotificationCoalescer,
+    build_push_envelope, parse_push_message,
+)
+from utils.intervals import IntervalIndex
+from utils.retrieval import AssignmentIndex
+
+TZ = ZoneInfo(planner.TIME_ZONE)
+
+
+def _at(day, hour, minute=0):
+    return datetime.datetime(2026, 3, day, hour, minute, tzinfo=TZ)
+
+
+def _pending(course, *assignments):
+    """get_pending_assignments_for_calendar structure for one course: (title, due_date, due_time) tuples."""
+    return {course: {"not_submitted": [
+        {"title": title, "due_date": due_date, "due_time": due_time} for title, due_date, due_time in assignments
+    ]}}
+
+
+def _item(course_id, coursework_id, title, description="", state=None, due=None, course_name=None, update_time=None):
+    """A coursework snapshot item, as google_api.classroom builds them."""
+    due_date = {"year": due.year, "month": due.month, "day": due.day} if due else {}
+    return {
+        "key": f"{course_id}/{coursework_id}",
+        "course_id": course_id,
+        "course_name": course_name or course_id.title(),
+        "coursework_id": coursework_id,
+        "title": title,
+        "description": description,
+        "due_date": due_date,
+        "due_time": {"hours": 23, "minutes": 59} if due else {},
+        "update_time": update_time,
+        "state": state,
+    }
+
+
+class IntervalIndexTests(SimpleTestCase):
+    def test_bulk_load_merges_overlapping_and_touching_intervals(self):
+        index = IntervalIndex([(5, 7), (1, 3), (3, 4), (2, 2), (6, 9)])
+        self.assertEqual(list(index), [(1, 4), (5, 9)])
+
+    def test_add_merges_every_interval_it_spans(self):
+        index = IntervalIndex([(1, 2), (4, 5), (7, 8), (10, 11)])
+        index.add(2, 7)
+        self.assertEqual(list(index), [(1, 8), (10, 11)])
+        index.add(12, 12)
+        self.assertEqual(len(index), 2)
+
+    def test_overlaps_treats_intervals_as_half_open(self):
+        index = IntervalIndex([(10, 20)])
+        self.assertTrue(index.overlaps(15, 16))
+        self.assertTrue(index.overlaps(5, 11))
+        self.assertFalse(index.overlaps(20, 25))
+        self.assertFalse(index.overlaps(5, 10))
+
+    def test_free_slots_yields_gaps_inside_the_window(self):
+        index = IntervalIndex([(0, 2), (4, 6), (8, 12)])
+        self.assertEqual(list(index.free_slots(1, 10)), [(2, 4), (6, 8)])
+        self.assertEqual(list(index.free_slots(12, 15)), [(12, 15)])
+        self.assertEqual(list(IntervalIndex().free_slots(3, 5)), [(3, 5)])
+
+
+class PlanStudyBlocksTests(SimpleTestCase):
+    def test_blocks_skip_busy_time_and_stay_before_the_due_time(self):
+        busy = IntervalIndex([(_at(2, 9), _at(2, 11))])
+        planned, shortfalls = planner.plan_study_blocks(
+            _pending("Math", ("HW 1", "2026-03-03", "10:30")), busy, _at(2, 8),
+        )
+        self.assertEqual(shortfalls, [])
+        self.assertEqual([(b["start"], b["end"]) for b in planned], [
+            (_at(2, 11), _at(2, 12)),
+            (_at(3, 9), _at(3, 10)),
+        ])
+        self.assertTrue(busy.overlaps(_at(2, 11), _at(2, 12)))
+
+    def test_earliest_deadline_is_planned_first(self):
+        pending = {**_pending("Bio", ("Essay", "2026-03-05", "23:59")), **_pending("Math", ("Quiz", "2026-03-02", "23:59"))}
+        planned, _ = planner.plan_study_blocks(pending, IntervalIndex(), _at(2, 8), blocks_per_assignment=1)
+        self.assertEqual([(b["title"], b["start"]) for b in planned], [("Quiz", _at(2, 9)), ("Essay", _at(2, 10))])
+
+    def test_shortfall_when_there_are_not_enough_days(self):
+        planned, shortfalls = planner.plan_study_blocks(
+            _pending("Math", ("HW 1", "2026-03-02", "23:59")), IntervalIndex(), _at(2, 8), blocks_per_assignment=3,
+        )
+        self.assertEqual(len(planned), 1)
+        self.assertEqual(shortfalls[0]["missing_blocks"], 2)
+
+    def test_no_block_is_placed_after_the_horizon(self):
+        planned, shortfalls = planner.plan_study_blocks(
+            _pending("Math", ("Project", "2026-12-01", "23:59")), IntervalIndex(), _at(2, 8),
+            blocks_per_assignment=5, horizon_end=_at(4, 9, 30),
+        )
+        self.assertEqual([b["start"] for b in planned], [_at(2, 9), _at(3, 9)])
+        self.assertEqual(shortfalls[0]["missing_blocks"], 3)
+
+    def test_existing_blocks_count_towards_the_assignment(self):
+        pending = _pending("Math", ("HW 1", "2026-03-04", "23:59"))
+        key = planner.study_block_key("Math", "HW 1", _at(4, 23, 59))
+        planned, shortfalls = planner.plan_study_blocks(
+            pending, IntervalIndex(), _at(2, 8), existing_blocks={key: {datetime.date(2026, 3, 2)}},
+        )
+        self.assertEqual(shortfalls, [])
+        self.assertEqual([b["start"] for b in planned], [_at(3, 9)])
+        self.assertEqual(planned[0]["key"], key)
+
+
+class AssignmentIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = AssignmentIndex()
+        self.index.sync([
+            _item("bio", "1", "Photosynthesis lab report", "Measure oxygen output of leaves"),
+            _item("math", "1", "Linear algebra problem set", "Matrices and eigenvalues"),
+            _item("math", "2", "Calculus quiz", "Limits and derivatives"),
+        ])
+
+    def test_search_ranks_title_matches_first(self):
+        results = self.index.search("eigenvalues of matrices in linear algebra")
+        self.assertEqual(results[0][1]["key"], "math/1")
+        self.assertTrue(all(score > 0 for score, _ in results))
+
+    def test_search_without_known_terms_returns_nothing(self):
+        self.assertEqual(self.index.search("the and of"), [])
+        self.assertEqual(self.index.search("geography"), [])
+
+    def test_sync_only_counts_changed_items_and_drops_missing_ones(self):
+        unchanged = [
+            _item("bio", "1", "Photosynthesis lab report", "Measure oxygen output of leaves"),
+            _item("math", "1", "Linear algebra problem set", "Matrices and eigenvalues"),
+        ]
+        self.assertEqual(self.index.sync(unchanged), 1)
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search("calculus"), [])
+
+        unchanged[0]["state"] = "TURNED_IN"
+        self.assertEqual(self.index.sync(unchanged), 1)
+        self.assertEqual(self.index.sync(unchanged), 0)
+
+    def test_updated_item_is_found_by_its_new_text(self):
+        self.index.sync([_item("bio", "1", "Genetics worksheet"), _item("math", "2", "Calculus quiz")])
+        self.assertEqual(self.index.search("photosynthesis"), [])
+        self.assertEqual(self.index.search("genetics")[0][1]["key"], "bio/1")
+
+    def test_upcoming_skips_submitted_and_past_items(self):
+        now = datetime.datetime(2026, 3, 2, 12, 0)
+        self.index.sync([
+            _item("bio", "1", "Lab", due=datetime.date(2026, 3, 5)),
+            _item("bio", "2", "Essay", due=datetime.date(2026, 3, 3)),
+            _item("math", "1", "Quiz", due=datetime.date(2026, 3, 4), state="TURNED_IN"),
+            _item("math", "2", "Old quiz", due=datetime.date(2026, 3, 1)),
+        ])
+        self.assertEqual([item["key"] for item in self.index.upcoming(now)], ["bio/2", "bio/1"])
+
+
+class PushMessageTests(SimpleTestCase):
+    def test_coursework_notification(self):
+        body = build_push_envelope("reg-1", "c1", "w1", event_type="DELETED")
+        message = parse_push_message(body)
+        self.assertEqual(message["registration_id"], "reg-1")
+        self.assertEqual(message["collection"], COURSE_WORK_COLLECTION)
+        self.assertEqual((message["event_type"], message["course_id"], message["coursework_id"]), ("DELETED", "c1", "w1"))
+
+    def test_submission_notification_names_its_coursework(self):
+        message = parse_push_message(build_push_envelope("reg-1", "c1", "w1", collection=SUBMISSION_COLLECTION))
+        self.assertEqual(message["collection"], SUBMISSION_COLLECTION)
+        self.assertEqual(message["coursework_id"], "w1")
+
+    def test_malformed_messages_are_rejected(self):
+        for body in ["not json", '{"message": {}}', '{"message": {"data": "e30="}}']:
+            with self.subTest(body=body), self.assertRaises(InvalidPushMessage):
+                parse_push_message(body)
+
+
+class NotificationCoalescerTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+        self.coalescer = NotificationCoalescer(
+            lambda *batch: self.batches.append(batch), debounce_seconds=60, max_delay_seconds=60,
+            course_refetch_threshold=3,
+        )
+
+    def test_repeated_changes_collapse_into_one_refetch(self):
+        for _ in range(3):
+            self.coalescer.add(1, "c1", "w1", "MODIFIED")
+        self.coalescer.add(1, "c1", "w2", "CREATED")
+        self.coalescer.add(2, "c1", "w1", "MODIFIED")
+        self.assertEqual(self.coalescer.flush(force=False), 0)
+        self.assertEqual(self.coalescer.flush(), 2)
+        self.assertEqual(sorted(self.batches), [(1, "c1", ["w1", "w2"], []), (2, "c1", ["w1"], [])])
+
+    def test_many_changes_refetch_the_whole_course(self):
+        for i in range(4):
+            self.coalescer.add(1, "c1", f"w{i}", "MODIFIED")
+        self.coalescer.flush()
+        self.assertEqual(self.batches, [(1, "c1", None, [])])
+
+    def test_only_coursework_deletions_delete(self):
+        self.coalescer.add(1, "c1", "w1", "DELETED", collection=SUBMISSION_COLLECTION)
+        self.coalescer.add(1, "c1", "w2", "DELETED", collection=COURSE_WORK_COLLECTION)
+        self.coalescer.flush()
+        self.assertEqual(self.batches, [(1, "c1", ["w1"], ["w2"])])
+
+
+class PruneForUserTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user("alice", "alice@example.com")
+        self.bob = User.objects.create_user("bob", "bob@example.com")
+        course = Course.objects.create(course_id="c1", name="Course 1")
+        self.shared = CourseWork.objects.create(course=course, coursework_id="w1", title="Shared")
+        self.own = CourseWork.objects.create(course=course, coursework_id="w2", title="Alice only")
+        for user, work in [(self.alice, self.shared), (self.bob, self.shared), (self.alice, self.own)]:
+            Submission.objects.create(user=user, coursework=work, state="CREATED")
+
+    def test_only_the_users_rows_and_orphaned_coursework_go(self):
+        removed = store._prune_for_user(self.alice, CourseWork.objects.filter(pk__in=[self.shared.pk, self.own.pk]))
+        self.assertEqual(removed, 1)
+        self.assertFalse(Submission.objects.filter(user=self.alice).exists())
+        self.assertEqual(list(Submission.objects.values_list("user", "coursework")), [(self.bob.pk, self.shared.pk)])
+        self.assertEqual(list(CourseWork.objects.values_list("coursework_id", flat=True)), ["w1"])
+
+    def test_deletions_are_logged_for_export_tombstones(self):
+        store._prune_for_user(self.alice, CourseWork.objects.filter(pk=self.own.pk))
+        self.assertEqual(
+            list(SubmissionDeletion.objects.values_list("user_id", "course_id", "coursework_id")),
+            [(self.alice.pk, "c1", "w2")],
+        )
+
+
+class ConversationStoreTests(TestCase):
+    def setUp(self):
+        # A long interval keeps the writer thread idle; the tests flush explicitly
+        self.conversations = ConversationStore(flush_interval_seconds=3600, batch_size=1000)
+        self.start = timezone.now() - datetime.timedelta(hours=1)
+
+    def _create_turns(self, count, user_key="u1", same_time=False):
+        return ConversationTurn.objects.bulk_create([
+            ConversationTurn(
+                user_key=user_key, role=ConversationTurn.HUMAN, content=f"m{i}",
+                created_at=self.start + datetime.timedelta(seconds=0 if same_time else i),
+            )
+            for i in range(count)
+        ])
+
+    def _page_contents(self, before=None, limit=3):
+        messages, has_older = self.conversations.load_page("u1", before=before, limit=limit)
+        return [m["content"] for m in messages], has_older, messages
+
+    def test_pages_walk_back_from_newest_without_gaps(self):
+        self._create_turns(7)
+        self._create_turns(2, user_key="u2")
+        contents, has_older, messages = self._page_contents()
+        self.assertEqual((contents, has_older), (["m4", "m5", "m6"], True))
+        contents, has_older, messages = self._page_contents((messages[0]["created_at"], messages[0]["id"]))
+        self.assertEqual((contents, has_older), (["m1", "m2", "m3"], True))
+        contents, has_older, _ = self._page_contents((messages[0]["created_at"], messages[0]["id"]))
+        self.assertEqual((contents, has_older), (["m0"], False))
+
+    def test_turns_sharing_a_timestamp_are_neither_skipped_nor_repeated(self):
+        self._create_turns(5, same_time=True)
+        seen = []
+        before, has_older = None, True
+        while has_older:
+            contents, has_older, messages = self._page_contents(before, limit=2)
+            seen[:0] = contents
+            before = (messages[0]["created_at"], messages[0]["id"])
+        self.assertEqual(seen, [f"m{i}" for i in range(5)])
+
+    def test_unwritten_cursor_includes_its_timestamp(self):
+        turns = self._create_turns(3, same_time=True)
+        contents, _, _ = self._page_contents((turns[0].created_at, None))
+        self.assertEqual(sorted(contents), ["m0", "m1", "m2"])
+
+    def test_buffered_turns_are_written_before_reading(self):
+        message = self.conversations.append("u1", ConversationTurn.AI, "buffered")
+        self.assertIsNone(message["id"])
+        contents, has_older, messages = self._page_contents()
+        self.assertEqual((contents, has_older), (["buffered"], False))
+        self.assertEqual(message["id"], messages[0]["id"])
+
+    def test_buffer_drops_oldest_turns_beyond_its_cap(self):
+        self.conversations.max_buffered = 2
+        with self.assertLogs("dashboard.conversations", "ERROR"):
+            for i in range(3):
+                self.conversations.append("u1", ConversationTurn.HUMAN, f"m{i}")
+        self.assertEqual(self.conversations.dropped, 1)
+        with self.assertLogs("dashboard.conversations", "WARNING"):
+            self.assertEqual(self.conversations.flush(), 2)
+        self.assertEqual(self.conversations.dropped, 0)
+        self.assertEqual(list(ConversationTurn.objects.order_by("id").values_list("content", flat=True)), ["m1", "m2"])
+
+
+class StoreItemsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("alice", "alice@example.com")
+        self.course = Course.objects.create(course_id="c1", name="Course 1")
+        self.items = [
+            _item("c1", "w1", "Essay", state="CREATED", due=datetime.date(2026, 3, 5), update_time="t1"),
+            _item("c1", "w2", "Quiz", state="CREATED", update_time="t1"),
+        ]
+        store.store_items(self.user, self.course, self.items)
+        self.stamped = self._timestamps()
+
+    def _timestamps(self):
+        return (
+            dict(CourseWork.objects.values_list("coursework_id", "updated_at")),
+            dict(Submission.objects.values_list("coursework__coursework_id", "updated_at")),
+        )
+
+    def test_unchanged_items_are_not_rewritten(self):
+        store.store_items(self.user, self.course, self.items)
+        self.assertEqual(self._timestamps(), self.stamped)
+
+    def test_only_changed_rows_move_their_timestamp(self):
+        self.items[0]["title"] = "Longer essay"
+        self.items[1]["state"] = "TURNED_IN"
+        store.store_items(self.user, self.course, self.items)
+        coursework, submissions = self._timestamps()
+        self.assertGreater(coursework["w1"], self.stamped[0]["w1"])
+        self.assertEqual(coursework["w2"], self.stamped[0]["w2"])
+        self.assertEqual(submissions["w1"], self.stamped[1]["w1"])
+        self.assertGreater(submissions["w2"], self.stamped[1]["w2"])
+        self.assertEqual(CourseWork.objects.get(coursework_id="w1").title, "Longer essay")
+
+
+class ExportAssignmentsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.out = self.directory.name
+        self.users = [get_user_model().objects.create_user(name, f"{name}@example.com") for name in ("alice", "bob")]
+        course = Course.objects.create(course_id="c1", name="Course 1")
+        self.dated = CourseWork.objects.create(course=course, coursework_id="w1", title="Essay", due_date=datetime.date(2026, 3, 5))
+        self.undated = CourseWork.objects.create(course=course, coursework_id="w2", title="Reading")
+        for user in self.users:
+            for work in (self.dated, self.undated):
+                Submission.objects.create(user=user, coursework=work, state="CREATED")
+        self._stamp(CourseWork.objects.all(), minutes_ago=30)
+        self._stamp(Submission.objects.all(), minutes_ago=30)
+
+    @staticmethod
+    def _stamp(queryset, minutes_ago):
+        # update() bypasses auto_now, so the tests control the export watermark
+        queryset.update(updated_at=timezone.now() - datetime.timedelta(minutes=minutes_ago))
+
+    def _export(self, *args):
+        stdout = io.StringIO()
+        call_command("export_assignments", self.out, "--lag-seconds", "0", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def _rows(self):
+        import pyarrow.dataset as ds
+        return ds.dataset(self.out, format="parquet", partitioning="hive").to_table().to_pylist()
+
+    def _latest_live(self):
+        """The reader rule from the command help: latest row per key across partitions, minus deletions."""
+        latest = {}
+        for row in sorted(self._rows(), key=lambda r: r["submission_updated_at"]):
+            latest[(row["user_id"], row["course_id"], row["coursework_id"])] = row
+        return {key: row["state"] for key, row in latest.items() if not row["deleted"]}
+
+    def test_incremental_runs_append_changes_and_tombstones(self):
+        self._export()
+        self.assertEqual(len(self._rows()), 4)
+        self.assertTrue((Path(self.out) / "due=2026-03-05").is_dir())
+        self.assertTrue((Path(self.out) / "due=none").is_dir())
+
+        alice, bob = self.users
+        Submission.objects.filter(user=alice, coursework=self.dated).update(state="TURNED_IN")
+        self._stamp(Submission.objects.filter(user=alice, coursework=self.dated), minutes_ago=10)
+        store._delete_submissions(Submission.objects.filter(user=bob, coursework=self.undated))
+        self._export()
+
+        rows = self._rows()
+        self.assertEqual(len(rows), 6)
+        tombstones = [r for r in rows if r["deleted"]]
+        self.assertEqual([(r["user_id"], r["coursework_id"]) for r in tombstones], [(bob.pk, "w2")])
+        self.assertEqual(self._latest_live(), {
+            (alice.pk, "c1", "w1"): "TURNED_IN",
+            (alice.pk, "c1", "w2"): "CREATED",
+            (bob.pk, "c1", "w1"): "CREATED",
+        })
+        self.assertIn("Nothing new to export.", self._export())
+
+    def test_coursework_change_exports_every_users_row(self):
+        self._export()
+        CourseWork.objects.filter(pk=self.undated.pk).update(due_date=datetime.date(2026, 4, 1))
+        self._stamp(CourseWork.objects.filter(pk=self.undated.pk), minutes_ago=10)
+        self._export()
+        moved = [r for r in self._rows() if r["due"] == "2026-04-01"]
+        self.assertEqual(sorted(r["user_id"] for r in moved), [u.pk for u in self.users])
+        self.assertEqual(len(self._latest_live()), 4)
+
+    def test_full_export_replaces_previous_files(self):
+        self._export()
+        store._delete_submissions(Submission.objects.filter(user=self.users[1]))
+        self._export()
+        self._export("--full")
+        rows = self._rows()
+        self.assertEqual(len(rows), 2)
+        self.assertFalse(any(r["deleted"] for r in rows))
+        self.assertEqual(len({r["export_id"] for r in rows}), 1)
+        state = json.loads((Path(self.out) / "_export_state.json").read_text())
+        self.assertEqual(state["last_export_rows"], 2)
@@ -1,5 +1,97 @@
+import json
+import logging
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .models import ClassroomRegistration
+from .push import InvalidPushMessage, get_coalescer, parse_push_message
+
+logger = logging.getLogger(__name__)
 
 def profile(request):
     # You can access the logged-in user with request.user
     return render(request, 'profile.html', {'user': request.user})
+
+
+def _job_server_request(path, method="GET", timeout=5):
+    """Forwards a request to the agent job server's status API and relays its JSON answer."""
+    url = settings.AGENT_JOB_SERVER_URL.rstrip("/") + path
+    try:
+        with urlopen(Request(url, method=method, data=b"" if method == "POST" else None), timeout=timeout) as response:
+            return JsonResponse(json.loads(response.read()), status=response.status)
+    except HTTPError as e:
+        return JsonResponse(json.loads(e.read() or b"{}"), status=e.code)
+    except (URLError, TimeoutError) as e:
+        return JsonResponse({"error": f"Agent job server unavailable: {e}"}, status=502)
+
+
+@login_required
+@require_GET
+def agent_job_status(request, job_id):
+    # ?wait=<seconds> long-polls until the job finishes (capped server-side)
+    try:
+        wait = min(float(request.GET.get("wait", 0)), 30.0)
+    except ValueError:
+        wait = 0.0
+    # Jobs are owned by the Google account (email) that started them in the Streamlit app
+    query = {"owner": request.user.email}
+    if wait > 0:
+        query["wait"] = wait
+    return _job_server_request(f"/jobs/{job_id}?{urlencode(query)}", timeout=wait + 5)
+
+
+@login_required
+@require_POST
+def agent_job_cancel(request, job_id):
+    return _job_server_request(f"/jobs/{job_id}/cancel?{urlencode({'owner': request.user.email})}", method="POST")
+
+
+@login_required
+@require_GET
+def agent_job_metrics(request):
+    return _job_server_request("/metrics")
+
+
+@csrf_exempt
+@require_POST
+def classroom_push(request):
+    """
+    Pub/Sub push endpoint for Classroom course-work notifications.
+    Only queues a debounced re-fetch; any 2xx acknowledges the message, so
+    messages we cannot use are acknowledged too instead of being redelivered.
+    """
+    if not settings.CLASSROOM_PUSH_TOKEN or not constant_time_compare(
+        request.GET.get("token", ""), settings.CLASSROOM_PUSH_TOKEN
+    ):
+        return HttpResponseForbidden("Invalid push token.")
+
+    try:
+        notification = parse_push_message(request.body)
+    except InvalidPushMessage as e:
+        logger.warning(f"Ignoring Classroom push message: {e}")
+        return HttpResponse(status=204)
+
+    registration = ClassroomRegistration.objects.filter(
+        registration_id=notification["registration_id"]
+    ).only("user_id").first()
+    if registration is None:
+        logger.warning(f"Ignoring Classroom push for unknown registration {notification['registration_id']!r}")
+        return HttpResponse(status=204)
+
+    get_coalescer().add(
+        registration.user_id,
+        notification["course_id"],
+        notification["coursework_id"],
+        notification["event_type"],
+        notification["collection"],
+    )
+    return HttpResponse(status=204)
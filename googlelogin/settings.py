@@ -12,9 +12,15 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The Classroom fetch code lives in the Streamlit app's package tree; make it importable here
+LANGCHAIN_DIR = BASE_DIR / 'Langchain'
+if str(LANGCHAIN_DIR) not in sys.path:
+    sys.path.append(str(LANGCHAIN_DIR))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -84,6 +90,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Store upserts read then write inside one transaction; taking the write lock up front makes
+        # concurrent writers (push re-fetches, the conversation writer) wait instead of failing
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
@@ -149,6 +158,8 @@ SOCIALACCOUNT_PROVIDERS = {
             'https://www.googleapis.com/auth/classroom.announcements',  # Manage announcements
             'https://www.googleapis.com/auth/classroom.course-work.readonly',  # View assignments
             'https://www.googleapis.com/auth/classroom.student-submissions.students.readonly',  # View coursework and marks for students
+            'https://www.googleapis.com/auth/classroom.coursework.me.readonly',  # View your own coursework and submissions
+            'https://www.googleapis.com/auth/classroom.push-notifications',  # Receive course-work change notifications
         ],
         'AUTH_PARAMS': {
             'access_type': 'offline',  # This allows the application to get a refresh token
@@ -157,6 +168,9 @@ SOCIALACCOUNT_PROVIDERS = {
     }
 }
 
+# Keep OAuth tokens so background re-fetches (push notifications) can call Classroom
+SOCIALACCOUNT_STORE_TOKENS = True
+
 # Add any other necessary configurations here
 
 
@@ -167,3 +181,21 @@ ACCOUNT_EMAIL_REQUIRED = True
 # settings.py
 LOGIN_REDIRECT_URL = '/accounts/profile/'  # Change this as per your desired path
 ACCOUNT_LOGOUT_REDIRECT_URL = '/'
+
+# Status API of the agent job server running alongside the Streamlit app
+# (started when AGENT_JOB_HTTP_PORT is set; see Langchain/agents/job_server.py)
+AGENT_JOB_SERVER_URL = os.environ.get('AGENT_JOB_SERVER_URL', 'http://127.0.0.1:8765')
+
+# Classroom push notifications (Pub/Sub push subscription -> /classroom/push/?token=...)
+CLASSROOM_PUSH_TOKEN = os.environ.get('CLASSROOM_PUSH_TOKEN', '')
+CLASSROOM_PUSH_TOPIC = os.environ.get('CLASSROOM_PUSH_TOPIC', '')  # projects/<project>/topics/<topic>
+CLASSROOM_PUSH_DEBOUNCE_SECONDS = float(os.environ.get('CLASSROOM_PUSH_DEBOUNCE_SECONDS', '5'))
+CLASSROOM_PUSH_MAX_DELAY_SECONDS = float(os.environ.get('CLASSROOM_PUSH_MAX_DELAY_SECONDS', '30'))
+# More distinct changed items than this in one course collapses into a single course re-fetch
+CLASSROOM_PUSH_COURSE_REFETCH_THRESHOLD = int(os.environ.get('CLASSROOM_PUSH_COURSE_REFETCH_THRESHOLD', '5'))
+
+# Streamlit chat history (dashboard.conversations): buffered turns are written in batches
+CONVERSATION_FLUSH_SECONDS = float(os.environ.get('CONVERSATION_FLUSH_SECONDS', '1'))
+CONVERSATION_FLUSH_BATCH_SIZE = int(os.environ.get('CONVERSATION_FLUSH_BATCH_SIZE', '50'))
+# Turns held in memory while the database is unreachable; beyond this the oldest are dropped
+CONVERSATION_MAX_BUFFERED = int(os.environ.get('CONVERSATION_MAX_BUFFERED', '5000'))
@@ -6,6 +6,10 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include("allauth.urls")),
     path('accounts/profile/', views.profile, name="profile"),
+    path('classroom/push/', views.classroom_push, name="classroom_push"),
+    path('agent/jobs/metrics/', views.agent_job_metrics, name="agent_job_metrics"),
+    path('agent/jobs/<str:job_id>/', views.agent_job_status, name="agent_job_status"),
+    path('agent/jobs/<str:job_id>/cancel/', views.agent_job_cancel, name="agent_job_cancel"),
     #path('accounts/profile/', views.dashboard_view, name="profile"),
 
     #path('', include('dashboard.urls')),